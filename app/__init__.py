@@ -1,74 +1,227 @@
 import os
 import secrets
-from pathlib import Path
-
-import sentry_sdk
 
 from flask import Flask
-from flask_admin import Admin
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_restful import Api
-from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
-from sentry_sdk.integrations.flask import FlaskIntegration
-
-sentry_sdk.init(dsn=os.environ.get("SENTRY_DSN", ""), integrations=[FlaskIntegration()])
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from .assets import Assets
+from .cache import FragmentCache
+from .compression import Compression
+from .database import (
+    RoutingSQLAlchemy,
+    configure_engines,
+    database_url,
+    dispose_engines,
+    engine_options,
+)
+from .metrics import Metrics
+from .monitoring import init_sentry, parse_sample_rates
+from .ratelimit import RateLimiter
+from .auth.credentials import CredentialCache
+from .auth.principals import PrincipalCache
 
 ALLOWED_EXTENSIONS = set(["png", "jpg", "jpeg", "gif"])
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
 csrf = CSRFProtect()
+cache = FragmentCache()
+credentials = CredentialCache()
+principals = PrincipalCache()
+assets = Assets()
+metrics = Metrics()
+limiter = RateLimiter()
+compression = Compression()
+from .registry import CategoryRegistry
+
+category_registry = CategoryRegistry(cache)
 my_api = Api(decorators=[csrf.exempt])
-from .auth.views import CustomAdminIndexView
-
-admin = Admin(index_view=CustomAdminIndexView())
+from .serializers import output_json
 
+my_api.representation("application/json")(output_json)
 # Initialize REST APIs
-from .api import ProductApi
+from .api import ProductApi, ProductBatchApi, ProductExportApi, TokenApi
 
 my_api.add_resource(
     ProductApi,
     "/api/v1/product",
     "/api/v1/product/<int:id>",
 )
+my_api.add_resource(ProductBatchApi, "/api/v1/products:batch")
+my_api.add_resource(ProductExportApi, "/api/v1/products:export")
+my_api.add_resource(TokenApi, "/api/v1/token")
 
 
-def create_app():
+def create_app(config=None):
     # Ensure tables are created by db.create_all()
     from .models import Product, Category
     from .auth.models import User
 
     app = Flask(__name__)
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY") or secrets.token_hex(32)
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
-        basedir, "test.db"
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url(
+        os.environ.get("DATABASE_URL")
+        or "sqlite:///" + os.path.join(basedir, "test.db")
+    )
+    app.config["SQLALCHEMY_BINDS"] = {}
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        app.config["SQLALCHEMY_BINDS"]["replica"] = database_url(
+            os.environ["DATABASE_REPLICA_URL"]
+        )
+    app.config["DATABASE_POOL_SIZE"] = int(os.environ.get("DATABASE_POOL_SIZE", 5))
+    app.config["DATABASE_MAX_OVERFLOW"] = int(
+        os.environ.get("DATABASE_MAX_OVERFLOW", 10)
+    )
+    app.config["DATABASE_POOL_TIMEOUT"] = int(
+        os.environ.get("DATABASE_POOL_TIMEOUT", 30)
+    )
+    app.config["DATABASE_POOL_RECYCLE"] = int(
+        os.environ.get("DATABASE_POOL_RECYCLE", 1800)
+    )
+    app.config["DATABASE_POOL_PRE_PING"] = (
+        os.environ.get("DATABASE_POOL_PRE_PING", "1") != "0"
+    )
+    app.config["SQLITE_BUSY_TIMEOUT"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    app.config["SQLITE_MMAP_SIZE"] = int(
+        os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["UPLOAD_FOLDER"] = os.path.realpath(".") + "/app/static/uploads"
+    app.config["IMAGE_WORKERS"] = int(os.environ.get("IMAGE_WORKERS", 2))
+    # "x-sendfile" (Apache, lighttpd) or "x-accel-redirect" (nginx) hands
+    # uploads to the front-end server instead of streaming them from Flask
+    app.config["UPLOAD_SENDFILE"] = os.environ.get("UPLOAD_SENDFILE")
+    app.config["UPLOAD_ACCEL_PREFIX"] = os.environ.get(
+        "UPLOAD_ACCEL_PREFIX", "/protected-uploads/"
+    )
     app.config["GITHUB_OAUTH_CLIENT_ID"] = os.environ.get("GITHUB_OAUTH_CLIENT_ID")
     app.config["GITHUB_OAUTH_CLIENT_SECRET"] = os.environ.get(
         "GITHUB_OAUTH_CLIENT_SECRET"
     )
-
-    # Create uploads directory
-    Path(app.config["UPLOAD_FOLDER"]).mkdir(parents=True, exist_ok=True)
+    app.config["CACHE_TYPE"] = os.environ.get("CACHE_TYPE", "lru")
+    app.config["CACHE_REDIS_URL"] = os.environ.get("CACHE_REDIS_URL")
+    app.config["CACHE_DEFAULT_TIMEOUT"] = int(
+        os.environ.get("CACHE_DEFAULT_TIMEOUT", 300)
+    )
+    app.config["CACHE_MAXSIZE"] = int(os.environ.get("CACHE_MAXSIZE", 1024))
+    app.config["API_CREDENTIAL_CACHE_TTL"] = int(
+        os.environ.get("API_CREDENTIAL_CACHE_TTL", 300)
+    )
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 60))
+    app.config["API_TOKEN_MAX_AGE"] = int(os.environ.get("API_TOKEN_MAX_AGE", 3600))
+    app.config["SENTRY_DSN"] = os.environ.get("SENTRY_DSN")
+    app.config["SENTRY_TRACES_SAMPLE_RATE"] = float(
+        os.environ.get("SENTRY_TRACES_SAMPLE_RATE", 0)
+    )
+    app.config["SENTRY_ENDPOINT_SAMPLE_RATES"] = parse_sample_rates(
+        os.environ.get("SENTRY_ENDPOINT_SAMPLE_RATES")
+    )
+    app.config["SENTRY_SLOW_REQUEST_MS"] = int(
+        os.environ.get("SENTRY_SLOW_REQUEST_MS", 0)
+    )
+    # Let migrations own the schema instead of creating tables on every boot
+    app.config["DATABASE_CREATE_ALL"] = (
+        os.environ.get("DATABASE_CREATE_ALL", "1") != "0"
+    )
+    app.config["ADMIN_ENABLED"] = os.environ.get("ADMIN_ENABLED", "1") != "0"
+    # Admin lists count rows exactly up to this many, and estimate above it
+    app.config["ADMIN_EXACT_COUNT_LIMIT"] = int(
+        os.environ.get("ADMIN_EXACT_COUNT_LIMIT", 10000)
+    )
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") != "0"
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    app.config["API_MAX_LIMIT"] = int(os.environ.get("API_MAX_LIMIT", 100))
+    app.config["API_BATCH_CHUNK_SIZE"] = int(
+        os.environ.get("API_BATCH_CHUNK_SIZE", 1000)
+    )
+    # Proxies in front of the app whose X-Forwarded-For to trust, e.g. 1 for
+    # the Heroku router, so request.remote_addr is the client's address
+    app.config["PROXY_FIX_X_FOR"] = int(os.environ.get("PROXY_FIX_X_FOR", 0))
+    app.config["RATELIMIT_ENABLED"] = os.environ.get("RATELIMIT_ENABLED", "1") != "0"
+    app.config["RATELIMIT_BACKEND"] = os.environ.get("RATELIMIT_BACKEND", "local")
+    app.config["RATELIMIT_REDIS_URL"] = os.environ.get(
+        "RATELIMIT_REDIS_URL", os.environ.get("CACHE_REDIS_URL")
+    )
+    # Requests per second a client may sustain, and how many it may burst
+    app.config["RATELIMIT_READ_RATE"] = float(os.environ.get("RATELIMIT_READ_RATE", 20))
+    app.config["RATELIMIT_READ_BURST"] = int(os.environ.get("RATELIMIT_READ_BURST", 40))
+    app.config["RATELIMIT_WRITE_RATE"] = float(
+        os.environ.get("RATELIMIT_WRITE_RATE", 5)
+    )
+    app.config["RATELIMIT_WRITE_BURST"] = int(
+        os.environ.get("RATELIMIT_WRITE_BURST", 10)
+    )
+    # Failed API authentications an address may sustain per second and burst
+    app.config["RATELIMIT_AUTH_FAILURE_RATE"] = float(
+        os.environ.get("RATELIMIT_AUTH_FAILURE_RATE", 0.5)
+    )
+    app.config["RATELIMIT_AUTH_FAILURE_BURST"] = int(
+        os.environ.get("RATELIMIT_AUTH_FAILURE_BURST", 10)
+    )
+    # Concurrent API writes, in total with redis. The local backend counts
+    # per worker, which only limits threaded workers.
+    app.config["RATELIMIT_MAX_WRITES"] = int(os.environ.get("RATELIMIT_MAX_WRITES", 4))
+    # Seconds before redis frees a write slot its worker never released
+    app.config["RATELIMIT_WRITE_TIMEOUT"] = int(
+        os.environ.get("RATELIMIT_WRITE_TIMEOUT", 60)
+    )
+    app.config["COMPRESS_ENABLED"] = os.environ.get("COMPRESS_ENABLED", "1") != "0"
+    app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+    app.config["COMPRESS_GZIP_LEVEL"] = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+    app.config["COMPRESS_BR_LEVEL"] = int(os.environ.get("COMPRESS_BR_LEVEL", 4))
+    app.config["COMPRESS_ZSTD_LEVEL"] = int(os.environ.get("COMPRESS_ZSTD_LEVEL", 3))
+    # Settings passed in, such as a test database or SENTRY_TRANSPORT, win
+    # over the environment
+    app.config.update(config or {})
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+    if app.config["PROXY_FIX_X_FOR"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
+
+    # Set up error reporting and tracing
+    init_sentry(app)
 
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    configure_engines(app, db)
+    # Only the flask command runs migrations, and alembic is slow to import
+    if os.environ.get("FLASK_RUN_FROM_CLI"):
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
     my_api.init_app(app)
-    admin.init_app(app)
     csrf.init_app(app)
+    cache.init_app(app)
+    credentials.init_app(app)
+    principals.init_app(app)
+    category_registry.init_app(app)
+    assets.init_app(app)
+    metrics.init_app(app)
+    limiter.init_app(app)
+    # Registered after metrics so Server-Timing includes the compression
+    compression.init_app(app)
 
     # Initialize database
-    db.create_all(app=app)
+    if app.config["DATABASE_CREATE_ALL"]:
+        db.create_all(app=app)
+        from . import search
+
+        with app.app_context(), db.engine.begin() as connection:
+            search.create_index_tables(connection)
+        # Don't hand the connections opened here to forked workers
+        dispose_engines(app, db)
+
+    # Register CLI commands
+    from .cli import assets_cli, catalog
+
+    app.cli.add_command(catalog)
+    app.cli.add_command(assets_cli)
 
     # Apply the blueprints for views
     from .views import bp
@@ -79,16 +232,10 @@ def create_app():
     app.register_blueprint(github_bp, url_prefix="/login")
 
     # Add admin views
-    from .auth.views import (
-        DefaultAdminView,
-        CategoryAdminView,
-        ProductAdminView,
-        UserAdminView,
-    )
+    if app.config["ADMIN_ENABLED"]:
+        from .auth.admin import init_admin
 
-    admin.add_view(UserAdminView(User, db.session))
-    admin.add_view(ProductAdminView(Product, db.session))
-    admin.add_view(CategoryAdminView(Category, db.session))
+        init_admin(app)
 
     # Set up error handlers
     app.register_error_handler(400, views.bad_request)
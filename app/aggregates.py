@@ -0,0 +1,238 @@
+from sqlalchemy import (
+    Float,
+    Integer,
+    bindparam,
+    case,
+    event,
+    func,
+    inspect,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session, object_session
+
+from .cache import invalidate_on_commit
+from .models import Category, Product
+
+
+class CategoryStats:
+    """Changes to the per-category product aggregates, collected while
+    products are written and applied with a couple of statements.
+
+    Counts, totals and a widened min/max are applied as deltas. Taking away
+    a product priced at its category's minimum or maximum makes that
+    category's min/max be recomputed, which the ``(category_id, price)``
+    index answers without reading the category's products.
+    """
+
+    def __init__(self):
+        self.deltas = {}
+
+    def __bool__(self):
+        return bool(self.deltas)
+
+    def _delta(self, category_id):
+        return self.deltas.setdefault(
+            category_id,
+            {"count": 0, "total": 0.0, "low": None, "high": None, "removed": []},
+        )
+
+    def add(self, category_id, price):
+        if category_id is None:
+            return
+        delta = self._delta(category_id)
+        delta["count"] += 1
+        if price is not None:
+            # Forms hand over a Decimal until the row is loaded back
+            price = float(price)
+            delta["total"] += price
+            delta["low"] = price if delta["low"] is None else min(delta["low"], price)
+            delta["high"] = (
+                price if delta["high"] is None else max(delta["high"], price)
+            )
+
+    def remove(self, category_id, price):
+        if category_id is None:
+            return
+        delta = self._delta(category_id)
+        delta["count"] -= 1
+        if price is not None:
+            price = float(price)
+            delta["total"] -= price
+            delta["removed"].append(price)
+
+    def apply(self, connection):
+        if not self.deltas:
+            return
+        low, high = bindparam("low", type_=Float), bindparam("high", type_=Float)
+        connection.execute(
+            _update_stats()
+            .where(Category.id == bindparam("category"))
+            .values(
+                product_count=Category.product_count
+                + bindparam("count", type_=Integer),
+                price_total=Category.price_total + bindparam("total", type_=Float),
+                price_min=case(
+                    (
+                        low.isnot(None)
+                        & (Category.price_min.is_(None) | (low < Category.price_min)),
+                        low,
+                    ),
+                    else_=Category.price_min,
+                ),
+                price_max=case(
+                    (
+                        high.isnot(None)
+                        & (Category.price_max.is_(None) | (high > Category.price_max)),
+                        high,
+                    ),
+                    else_=Category.price_max,
+                ),
+            ),
+            [
+                {
+                    "category": id,
+                    "count": d["count"],
+                    "total": d["total"],
+                    "low": d["low"],
+                    "high": d["high"],
+                }
+                for id, d in self.deltas.items()
+            ],
+        )
+        removed = [
+            {"category": id, "low": min(d["removed"]), "high": max(d["removed"])}
+            for id, d in self.deltas.items()
+            if d["removed"]
+        ]
+        if removed:
+            connection.execute(
+                _update_stats()
+                .where(
+                    Category.id == bindparam("category"),
+                    or_(
+                        Category.price_min >= bindparam("low", type_=Float),
+                        Category.price_max <= bindparam("high", type_=Float),
+                    ),
+                )
+                .values(price_min=_price(func.min), price_max=_price(func.max)),
+                removed,
+            )
+        self.deltas = {}
+
+
+def _update_stats():
+    # Setting updated_at to itself keeps its onupdate from running. It is
+    # the category's version in the product validators, which don't show
+    # the aggregates.
+    return update(Category).values(updated_at=Category.updated_at)
+
+
+def _price(aggregate):
+    return (
+        select(aggregate(Product.price))
+        .where(Product.category_id == Category.id)
+        .scalar_subquery()
+    )
+
+
+def reconcile(connection, category_ids=None):
+    """Recompute the aggregates from the product table in one GROUP BY pass,
+    for every category or only ``category_ids``. Returns the number of
+    categories that have products."""
+    stats = select(
+        Product.category_id,
+        func.count(Product.id),
+        func.min(Product.price),
+        func.max(Product.price),
+        func.coalesce(func.sum(Product.price), 0),
+    ).group_by(Product.category_id)
+    reset = _update_stats().values(
+        product_count=0, price_min=None, price_max=None, price_total=0
+    )
+    if category_ids is not None:
+        stats = stats.where(Product.category_id.in_(category_ids))
+        reset = reset.where(Category.id.in_(category_ids))
+    rows = [
+        {"category": id, "count": count, "low": low, "high": high, "total": total}
+        for id, count, low, high, total in connection.execute(stats)
+        if id is not None
+    ]
+    connection.execute(reset)
+    if rows:
+        connection.execute(
+            _update_stats()
+            .where(Category.id == bindparam("category"))
+            .values(
+                product_count=bindparam("count"),
+                price_min=bindparam("low"),
+                price_max=bindparam("high"),
+                price_total=bindparam("total"),
+            ),
+            rows,
+        )
+    return len(rows)
+
+
+def _previous(target, attr):
+    history = inspect(target).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+
+def _stats(target):
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault("category_stats", CategoryStats())
+
+
+def _added(mapper, connection, target):
+    stats = _stats(target)
+    if stats is not None:
+        stats.add(target.category_id, target.price)
+
+
+def _changed(mapper, connection, target):
+    state = inspect(target)
+    if not (
+        state.attrs.price.history.has_changes()
+        or state.attrs.category_id.history.has_changes()
+    ):
+        return
+    stats = _stats(target)
+    if stats is not None:
+        stats.remove(_previous(target, "category_id"), _previous(target, "price"))
+        stats.add(target.category_id, target.price)
+
+
+def _removed(mapper, connection, target):
+    stats = _stats(target)
+    if stats is not None:
+        stats.remove(_previous(target, "category_id"), _previous(target, "price"))
+
+
+def _flushed(session, flush_context):
+    stats = session.info.pop("category_stats", None)
+    if stats:
+        stats.apply(session.connection())
+        invalidate_on_commit(session, {"category-stats"})
+
+
+def _rolled_back(session):
+    session.info.pop("category_stats", None)
+
+
+def _keep_previous(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the old price and category before they're overwritten, so an update
+# can take the product away from the right totals even if the row was expired
+event.listen(Product.price, "set", _keep_previous, active_history=True)
+event.listen(Product.category_id, "set", _keep_previous, active_history=True)
+event.listen(Product, "after_insert", _added)
+event.listen(Product, "after_update", _changed)
+event.listen(Product, "after_delete", _removed)
+event.listen(Session, "after_flush", _flushed)
+event.listen(Session, "after_rollback", _rolled_back)
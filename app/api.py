@@ -1,22 +1,54 @@
-import json
+from urllib.parse import urlencode
 
-from flask import abort, request
+from flask import Response, abort, current_app, request, stream_with_context
 from flask_restful import Resource, reqparse
-from flask_httpauth import HTTPBasicAuth
-
-from app import db
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, MultiAuth
+from itsdangerous import BadData, URLSafeTimedSerializer
+from sqlalchemy.exc import IntegrityError
+from werkzeug.http import http_date, quote_etag
+
+from app import credentials, db, limiter
+from . import batch, export, queries, serializers
+from .conditional import is_not_modified, latest, make_etag, not_modified_response
+from .database import read_only
 from .models import Category, Product
 from .auth.models import User
 
-auth = HTTPBasicAuth()
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth(scheme="Bearer")
+auth = MultiAuth(basic_auth, token_auth)
+# Inside the auth check, so budgets are per verified user. Failed checks are
+# limited per address outside it.
+rate_limited = limiter.limit(auth.current_user)
+auth_limited = limiter.limit_auth_failures
 
 
-@auth.verify_password
+@basic_auth.verify_password
 def verify_password(username, password):
+    generation = credentials.generation(username)
+    if credentials.check(username, password, generation):
+        return username
     user = User.query.filter_by(username=username).first()
     if user and user.check_password(password):
-        return True
-    return False
+        credentials.add(username, password, generation)
+        return username
+    return None
+
+
+def token_serializer():
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="api-token")
+
+
+@token_auth.verify_token
+def verify_token(token):
+    # Tokens are checked by signature alone, without the database
+    try:
+        data = token_serializer().loads(
+            token, max_age=current_app.config["API_TOKEN_MAX_AGE"]
+        )
+    except BadData:
+        return None
+    return data.get("username")
 
 
 parser = reqparse.RequestParser()
@@ -25,27 +57,86 @@ parser.add_argument("price", type=float)
 parser.add_argument("category", type=dict)
 
 
+def pagination_headers(result, limit):
+    links = []
+    for rel, cursor in (("next", result.next_cursor), ("prev", result.prev_cursor)):
+        if cursor:
+            query = urlencode({"cursor": cursor, "limit": limit})
+            links.append(f'<{request.base_url}?{query}>; rel="{rel}"')
+    headers = {}
+    if links:
+        headers["Link"] = ", ".join(links)
+    if result.next_cursor:
+        headers["X-Next-Cursor"] = result.next_cursor
+    if result.prev_cursor:
+        headers["X-Prev-Cursor"] = result.prev_cursor
+    if result.total is not None:
+        headers["X-Total-Count"] = str(result.total)
+    return headers
+
+
 class ProductApi(Resource):
-    decorators = [auth.login_required]
+    decorators = [rate_limited, auth.login_required, auth_limited]
 
+    @read_only
     def get(self, id=None):
+        headers = {}
         if id:
-            products = [Product.query.get_or_404(id)]
+            versions = [queries.product_versions().filter(Product.id == id).first()]
+            if versions[0] is None:
+                abort(404)
         else:
+            query = queries.product_rows()
             try:
-                page = int(request.args.get("page", 1))
-                limit = int(request.args.get("limit", 20))
+                # The windows reject a limit below 1; above the maximum it's
+                # clamped, so one request can't load the whole table
+                limit = min(
+                    int(request.args.get("limit", 20)),
+                    current_app.config["API_MAX_LIMIT"],
+                )
+                count = request.args.get("count", "none")
+                if count not in queries.COUNT_MODES:
+                    raise ValueError(f"Invalid count mode {count!r}")
+                if "page" in request.args:
+                    page = int(request.args["page"])
+                    window = queries.offset_window(
+                        queries.product_versions(), page, limit
+                    )
+                else:
+                    cursor = request.args.get("cursor")
+                    _, _, window = queries.keyset_window(
+                        queries.product_versions(), cursor, limit
+                    )
             except ValueError:
                 abort(400)
-            products = Product.query.paginate(page, limit).items
-        res = {}
-        for product in products:
-            res[product.id] = {
-                "name": product.name,
-                "price": product.price,
-                "category": product.category.name,
-            }
-        return json.dumps(res)
+            versions = window.all()
+
+        # One narrow query tells whether anything on the page changed, so an
+        # unchanged page is answered before loading or serializing products
+        total = None if id else queries.count_products(query, count)
+        etag = make_etag(request.full_path, versions, total)
+        # A page's newest row doesn't change when one of its rows is deleted,
+        # so collections are validated by the ETag, which covers the ids
+        last_modified = None
+        if id:
+            last_modified = latest(*versions[0][1:])
+        if is_not_modified(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+
+        if id:
+            products = [queries.product_rows().filter(Product.id == id).first_or_404()]
+        else:
+            if "page" in request.args:
+                result = queries.offset_page(query, page, limit)
+            else:
+                result = queries.keyset_paginate(query, cursor, limit)
+            result.total = total
+            products = result.items
+            headers = pagination_headers(result, limit)
+        headers["ETag"] = quote_etag(etag)
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+        return serializers.products(products), 200, headers
 
     def post(self):
         args = parser.parse_args()
@@ -53,20 +144,20 @@ class ProductApi(Resource):
         price = args["price"]
         category_name = args["category"]["name"]
 
-        category = Category.query.filter_by(name=category_name).first()
+        key = Category.normalize(category_name)
+        category = Category.query.filter_by(name_key=key).first()
         if not category:
             category = Category(category_name)
         product = Product(name, price, category, image_path=None)
         db.session.add(product)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request created the category first
+            db.session.rollback()
+            abort(409)
 
-        res = {}
-        res[product.id] = {
-            "name": product.name,
-            "price": product.price,
-            "category": product.category.name,
-        }
-        return json.dumps(res)
+        return serializers.products([product])
 
     def put(self, id):
         args = parser.parse_args()
@@ -74,23 +165,80 @@ class ProductApi(Resource):
         price = args["price"]
         category_name = args["category"]["name"]
 
-        category = Category.query.filter_by(name=category_name).first()
-        Product.query.filter_by(id=id).update(
-            {"name": name, "price": price, "category_id": category.id}
-        )
-        db.session.commit()
-
+        key = Category.normalize(category_name)
+        category = Category.query.filter_by(name_key=key).first()
+        if not category:
+            category = Category(category_name)
+        # Update through the ORM so mapper events keep the search index in sync
         product = Product.query.get_or_404(id)
-        res = {}
-        res[product.id] = {
-            "name": product.name,
-            "price": product.price,
-            "category": product.category.name,
-        }
-        return json.dumps(res)
+        product.name = name
+        product.price = price
+        product.category = category
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request created the category first
+            db.session.rollback()
+            abort(409)
+
+        return serializers.products([product])
 
     def delete(self, id):
         product = Product.query.get_or_404(id)
         db.session.delete(product)
         db.session.commit()
-        return json.dumps({"response": "Success"})
+        return {"response": "Success"}
+
+
+class TokenApi(Resource):
+    decorators = [
+        limiter.limit(basic_auth.current_user),
+        basic_auth.login_required,
+        auth_limited,
+    ]
+
+    def post(self):
+        token = token_serializer().dumps({"username": basic_auth.current_user()})
+        return {"token": token, "expires_in": current_app.config["API_TOKEN_MAX_AGE"]}
+
+
+class ProductBatchApi(Resource):
+    decorators = [rate_limited, auth.login_required, auth_limited]
+
+    def post(self):
+        """Create, update or delete many products in one request.
+
+        The body is either a JSON array or, with an ``application/x-ndjson``
+        content type, one JSON object per line, which is read as a stream.
+        Each item has an ``op`` of ``create``, ``update`` or ``delete`` plus
+        the same fields as a single ``ProductApi`` request.
+        """
+        if request.mimetype == "application/x-ndjson":
+            items = batch.iter_ndjson(request.stream)
+        else:
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                abort(400)
+        chunk_size = current_app.config["API_BATCH_CHUNK_SIZE"]
+        results = list(batch.apply_batch(items, chunk_size))
+        summary = {"results": results}
+        for status, key in ((201, "created"), (200, "updated"), (204, "deleted")):
+            summary[key] = sum(1 for r in results if r["status"] == status)
+        summary["failed"] = sum(1 for r in results if "error" in r)
+        return summary
+
+
+class ProductExportApi(Resource):
+    decorators = [rate_limited, auth.login_required, auth_limited]
+
+    @read_only
+    def get(self):
+        format = request.args.get("format", "ndjson")
+        if format not in export.FORMATS:
+            abort(400)
+        body = stream_with_context(export.iter_export(format))
+        response = Response(body, mimetype=export.FORMATS[format])
+        response.headers["Content-Disposition"] = (
+            f"attachment; filename=products.{format}"
+        )
+        return response
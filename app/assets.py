@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+ONE_YEAR = 365 * 24 * 60 * 60
+BUILD_DIR = "dist"
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+# Stylesheet sources, compiled into css/ by "npm run sass" and never served
+SOURCES = {".scss", ".sass"}
+# Names written by images.save_upload: a content hash plus an optional variant
+HASHED_UPLOAD = re.compile(r"^uploads/[0-9a-f]{32}(-\w+)?\.\w+$")
+
+
+class Assets:
+    """Serves static files with long-lived caching and precompression.
+
+    ``flask assets build`` copies every static file to a name that contains
+    a hash of its content and records the mapping in a manifest. ``url_for``
+    then points at the fingerprinted copy, so those responses can be cached
+    as immutable. Gzip and Brotli versions made at build time are sent to
+    clients that accept them.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.fingerprinted = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.load_manifest(app)
+        app.url_defaults(self.fingerprint_url)
+        app.view_functions["static"] = self.send_static
+        app.extensions["assets"] = self
+
+    def manifest_path(self, app):
+        return os.path.join(app.static_folder, BUILD_DIR, "manifest.json")
+
+    def load_manifest(self, app):
+        try:
+            with open(self.manifest_path(app)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self.fingerprinted = set(self.manifest.values())
+
+    def fingerprint_url(self, endpoint, values):
+        if endpoint == "static" and values.get("filename") in self.manifest:
+            values["filename"] = self.manifest[values["filename"]]
+
+    def send_static(self, filename):
+        app = current_app
+        if filename.startswith("uploads/") and app.config.get("UPLOAD_SENDFILE"):
+            response = self.send_upload(filename)
+        else:
+            response = self.send_file(filename)
+        if filename in self.fingerprinted or HASHED_UPLOAD.match(filename):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = ONE_YEAR
+            response.cache_control.immutable = True
+        return response
+
+    def send_file(self, filename):
+        static_folder = current_app.static_folder
+        if os.path.splitext(filename)[1] not in COMPRESSIBLE:
+            return send_from_directory(static_folder, filename)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in request.accept_encodings:
+                continue
+            path = safe_join(static_folder, filename + suffix)
+            if path and os.path.isfile(path):
+                response = send_from_directory(
+                    static_folder, filename + suffix, mimetype=mimetype
+                )
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(static_folder, filename)
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def send_upload(self, filename):
+        """Hand the upload to the front-end server instead of streaming it
+        from the worker."""
+        app = current_app
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0])
+        if app.config["UPLOAD_SENDFILE"] == "x-accel-redirect":
+            prefix = app.config["UPLOAD_ACCEL_PREFIX"].rstrip("/")
+            name = filename[len("uploads/") :]
+            response.headers["X-Accel-Redirect"] = f"{prefix}/{name}"
+        else:
+            response.headers["X-Sendfile"] = path
+        return response
+
+
+def build(static_folder):
+    """Fingerprint and precompress every static file into ``dist/``.
+
+    Returns the manifest, which maps original names to built ones.
+    """
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        if rel_root == "." and BUILD_DIR in dirs:
+            dirs.remove(BUILD_DIR)
+        # Uploads already have content-hashed names
+        if rel_root == "." and "uploads" in dirs:
+            dirs.remove("uploads")
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext in SOURCES:
+                continue
+            source = os.path.join(root, name)
+            with open(source, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            original = os.path.normpath(os.path.join(rel_root, name))
+            built = os.path.join(BUILD_DIR, os.path.dirname(original), stem)
+            built = f"{built}.{digest}{ext}".replace(os.sep, "/")
+            target = os.path.join(static_folder, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            if ext in COMPRESSIBLE:
+                write_compressed(target, data)
+            manifest[original.replace(os.sep, "/")] = built
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def write_compressed(path, data):
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
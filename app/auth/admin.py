@@ -0,0 +1,260 @@
+from flask import abort, current_app, flash, redirect, request, url_for
+from flask_admin import Admin, AdminIndexView, expose
+from flask_admin.actions import action
+from flask_admin.contrib.sqla import filters
+from flask_admin.contrib.sqla.view import ModelView
+from flask_admin.form import SecureForm, rules
+from flask_login import current_user
+from sqlalchemy import and_, func, or_
+from werkzeug.security import generate_password_hash
+from wtforms import PasswordField
+
+from app import db, queries
+from app.batch import update_products
+from app.forms import BulkCategoryForm, BulkPriceForm
+from app.models import Category, Product
+from .models import User
+
+
+def is_admin():
+    return current_user.is_authenticated and current_user.is_admin()
+
+
+def login_or_forbid():
+    if current_user.is_authenticated:
+        abort(403)
+    return redirect(url_for("auth.login"))
+
+
+class CustomAdminIndexView(AdminIndexView):
+    def is_accessible(self):
+        return is_admin()
+
+    def inaccessible_callback(self, name, **kwargs):
+        return login_or_forbid()
+
+
+class FilterStartsWith(filters.BaseSQLAFilter):
+    """Prefix filter written as a range, which an index on the column can
+    answer unlike ``LIKE 'value%'``."""
+
+    def apply(self, query, value, alias=None):
+        column = self.get_column(alias)
+        return query.filter(column >= value, column < value + "\uffff")
+
+    def operation(self):
+        return "starts with"
+
+
+class DefaultAdminView(ModelView):
+    """Model view whose list page stays fast on large tables.
+
+    In the default order pages are fetched by key instead of OFFSET, with
+    a cursor in the URL. Rows are counted exactly only up to
+    ``ADMIN_EXACT_COUNT_LIMIT``: unfiltered lists show an estimate above
+    it and filtered ones switch to a next/previous pager. Search matches
+    prefixes of ``column_searchable_list``, which should be indexed columns
+    of the model itself.
+    """
+
+    form_base_class = SecureForm
+    can_view_details = True
+    list_template = "admin/keyset_list.html"
+    # Flask-Admin's own COUNT(*) is replaced by count_rows
+    simple_list_pager = True
+
+    def is_accessible(self):
+        return is_admin()
+
+    def inaccessible_callback(self, name, **kwargs):
+        return login_or_forbid()
+
+    def get_list(
+        self,
+        page,
+        sort_column,
+        sort_desc,
+        search,
+        filters,
+        execute=True,
+        page_size=None,
+    ):
+        if page_size is None:
+            page_size = self.page_size
+        # Flask-Admin applies search, filters, joins and sorting; counting and
+        # paging happen here
+        _, query = super(DefaultAdminView, self).get_list(
+            0, sort_column, sort_desc, search, filters, execute=False, page_size=False
+        )
+        count = self.count_rows(query, filtered=bool(search or filters))
+        if not execute or page or sort_column is not None or not page_size:
+            query = self._apply_pagination(query, page, page_size)
+            return count, query.all() if execute else query
+        try:
+            return count, queries.keyset_page(
+                query, request.args.get("cursor"), page_size, key=self.model.id
+            )
+        except ValueError:
+            abort(400)
+
+    def count_rows(self, query, filtered):
+        limit = current_app.config["ADMIN_EXACT_COUNT_LIMIT"]
+        if not filtered:
+            estimate = queries.estimate_count(self.model)
+            if estimate > limit:
+                return estimate
+        # Stop counting past the limit rather than scan every match
+        matches = query.order_by(None).limit(limit + 1).subquery()
+        count = self.session.query(func.count()).select_from(matches).scalar()
+        return count if count <= limit else None
+
+    def cursor_url(self, cursor):
+        args = {k: v for k, v in request.args.items() if k not in ("cursor", "page")}
+        return self.get_url(".index_view", cursor=cursor, **args)
+
+    def _get_list_extra_args(self):
+        # Sorting, searching or filtering starts again from the first page
+        view_args = super(DefaultAdminView, self)._get_list_extra_args()
+        view_args.extra_args.pop("cursor", None)
+        return view_args
+
+    def search_term(self, search):
+        return search.strip()
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        term = self.search_term(search)
+        if not term:
+            return query, count_query, joins, count_joins
+        clause = or_(
+            *(
+                and_(column >= term, column < term + "\uffff")
+                for column, _ in self._search_fields
+            )
+        )
+        if count_query is not None:
+            count_query = count_query.filter(clause)
+        return query.filter(clause), count_query, joins, count_joins
+
+
+class UserAdminView(DefaultAdminView):
+    column_editable_list = ["username", "admin"]
+    column_searchable_list = ["username"]
+    column_sortable_list = ["username", "admin"]
+    column_exclude_list = ["pwdhash"]
+    column_filters = [
+        filters.FilterEqual(User.username, "Username"),
+        FilterStartsWith(User.username, "Username"),
+        "admin",
+    ]
+    form_excluded_columns = ["pwdhash"]
+    form_edit_rules = [
+        "username",
+        "admin",
+        rules.Header("Reset Password"),
+        "new_password",
+        "confirm",
+    ]
+    form_create_rules = ["username", "admin", "password"]
+
+    def scaffold_form(self):
+        form_class = super(UserAdminView, self).scaffold_form()
+        form_class.password = PasswordField("Password")
+        form_class.new_password = PasswordField("New Password")
+        form_class.confirm = PasswordField("Confirm New Password")
+        return form_class
+
+    def create_model(self, form):
+        model = self.model(form.username.data, form.password.data, form.admin.data)
+        form.populate_obj(model)
+        self.session.add(model)
+        self._on_model_change(form, model, True)
+        self.session.commit()
+
+    def update_model(self, form, model):
+        form.populate_obj(model)
+        if form.new_password.data:
+            if form.new_password.data != form.confirm.data:
+                flash("Passwords must match")
+                return
+            model.pwdhash = generate_password_hash(form.new_password.data)
+        self.session.add(model)
+        self._on_model_change(form, model, False)
+        self.session.commit()
+
+
+class ProductAdminView(DefaultAdminView):
+    column_list = ["name", "price", "image_path", "category"]
+    column_select_related_list = ["category"]
+    column_searchable_list = ["name"]
+
+    @action("change_price", "Change price")
+    def action_change_price(self, ids):
+        form = BulkPriceForm(ids=",".join(ids))
+        return self.render("admin/bulk_update.html", form=form, url=".change_price")
+
+    @action("change_category", "Move to category")
+    def action_change_category(self, ids):
+        form = BulkCategoryForm(ids=",".join(ids))
+        return self.render("admin/bulk_update.html", form=form, url=".change_category")
+
+    @expose("/change-price/", methods=["POST"])
+    def change_price(self):
+        form = BulkPriceForm()
+        if not form.validate():
+            return self.render("admin/bulk_update.html", form=form, url=".change_price")
+        if form.mode.data == "set":
+            price = float(form.amount.data)
+        else:
+            price = func.round(Product.price * (1 + float(form.amount.data) / 100), 2)
+        count = update_products(self.bulk_ids(form), {"price": price})
+        flash(f"Changed the price of {count} products")
+        return redirect(self.get_url(".index_view"))
+
+    @expose("/change-category/", methods=["POST"])
+    def change_category(self):
+        form = BulkCategoryForm()
+        if not form.validate():
+            return self.render(
+                "admin/bulk_update.html", form=form, url=".change_category"
+            )
+        count = update_products(
+            self.bulk_ids(form), {"category_id": form.category.data}
+        )
+        flash(f"Moved {count} products")
+        return redirect(self.get_url(".index_view"))
+
+    def bulk_ids(self, form):
+        try:
+            return [int(id) for id in form.ids.data.split(",")]
+        except ValueError:
+            abort(400)
+
+
+class CategoryAdminView(DefaultAdminView):
+    column_exclude_list = ["name_key", "price_total"]
+    form_excluded_columns = [
+        "name_key",
+        "product_count",
+        "price_min",
+        "price_max",
+        "price_total",
+    ]
+    # name_key is the indexed, normalized name
+    column_searchable_list = ["name_key"]
+    column_labels = {"name_key": "Name"}
+
+    def search_term(self, search):
+        return Category.normalize(search)
+
+    def scaffold_form(self):
+        form_class = super(CategoryAdminView, self).scaffold_form()
+        del form_class.products
+        return form_class
+
+
+def init_admin(app):
+    admin = Admin(app, index_view=CustomAdminIndexView())
+    admin.add_view(UserAdminView(User, db.session))
+    admin.add_view(ProductAdminView(Product, db.session))
+    admin.add_view(CategoryAdminView(Category, db.session))
+    return admin
@@ -0,0 +1,87 @@
+import hashlib
+import hmac
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.cache import LRUBackend
+
+
+class CredentialCache:
+    """Remembers recently verified API credentials so that repeat requests
+    skip the user query and the deliberately slow password hash.
+
+    Entries are keyed on an HMAC of the username and password under the
+    app's secret key, so the cache never holds anything that could be
+    replayed elsewhere. Each username has a generation counter that is
+    bumped whenever that user's password hash changes; entries from an older
+    generation are ignored. The cache is per process, so other workers only
+    forget a changed password once their entries expire after
+    ``API_CREDENTIAL_CACHE_TTL`` seconds.
+    """
+
+    def __init__(self, app=None):
+        self.backend = LRUBackend()
+        self.ttl = 300
+        self.key = b""
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = LRUBackend(app.config.get("API_CREDENTIAL_CACHE_SIZE", 1024))
+        self.ttl = app.config.get("API_CREDENTIAL_CACHE_TTL", 300)
+        self.key = app.config["SECRET_KEY"].encode()
+        if not self._listening:
+            _listen_for_password_changes(self)
+            self._listening = True
+
+    def generation(self, username):
+        return self.backend.get(f"generation:{username}") or 0
+
+    def check(self, username, password, generation):
+        if not self.ttl:
+            return False
+        return self.backend.get(self._digest(username, password)) == generation
+
+    def add(self, username, password, generation):
+        if self.ttl:
+            self.backend.set(self._digest(username, password), generation, self.ttl)
+
+    def invalidate(self, username):
+        self.backend.incr(f"generation:{username}")
+
+    def _digest(self, username, password):
+        message = f"{username}\0{password}".encode()
+        return hmac.new(self.key, message, hashlib.sha256).hexdigest()
+
+
+def _listen_for_password_changes(credentials):
+    from .models import User
+
+    def forget(target, usernames):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("changed_usernames", set()).update(usernames)
+
+    def updated(mapper, connection, target):
+        attrs = inspect(target).attrs
+        if attrs.pwdhash.history.has_changes() or attrs.username.history.has_changes():
+            forget(target, {target.username, *attrs.username.history.deleted})
+
+    def deleted(mapper, connection, target):
+        forget(target, {target.username})
+
+    # As with the fragment cache, only forget credentials once the new hash
+    # is committed so a concurrent request can't re-add the old password
+    def after_commit(session):
+        for username in session.info.pop("changed_usernames", ()):
+            credentials.invalidate(username)
+
+    def after_rollback(session):
+        session.info.pop("changed_usernames", None)
+
+    event.listen(User, "after_update", updated)
+    event.listen(User, "after_delete", deleted)
+    event.listen(Session, "after_commit", after_commit)
+    event.listen(Session, "after_rollback", after_rollback)
@@ -7,7 +7,7 @@ from app import db
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100))
+    username = db.Column(db.String(100), index=True, unique=True)
     pwdhash = db.Column(db.String())
     admin = db.Column(db.Boolean())
 
@@ -16,6 +16,25 @@ class User(db.Model):
         self.pwdhash = generate_password_hash(password)
         self.admin = admin
 
+    @classmethod
+    def free_username(cls, *candidates):
+        """Return the first of ``candidates`` no user has yet, or else the
+        first one with the lowest free numeric suffix."""
+        candidates = [c for c in candidates if c]
+        taken = {
+            name
+            for (name,) in db.session.query(cls.username).filter(
+                db.or_(*(cls.username.startswith(c) for c in candidates))
+            )
+        }
+        for candidate in candidates:
+            if candidate not in taken:
+                return candidate
+        suffix = 2
+        while f"{candidates[0]}-{suffix}" in taken:
+            suffix += 1
+        return f"{candidates[0]}-{suffix}"
+
     def check_password(self, password):
         return check_password_hash(self.pwdhash, password)
 
@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.cache import LRUBackend
+
+
+class UserPrincipal(namedtuple("UserPrincipal", "id username admin")):
+    """Immutable snapshot of a user with what requests need to know about
+    them: Flask-Login's user interface, the username and the admin flag."""
+
+    __slots__ = ()
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, bool(user.admin))
+
+    def get_id(self):
+        return str(self.id)
+
+    def is_admin(self):
+        return self.admin
+
+
+class PrincipalCache:
+    """Keeps recently loaded users as :class:`UserPrincipal` snapshots so
+    the Flask-Login user loader doesn't query the database on each request.
+
+    Like the credential cache, each user id has a generation counter that is
+    bumped once an update or delete of the user is committed in this process,
+    and entries from an older generation are ignored. The cache is per
+    process, so other workers see such a change once their
+    entry expires after ``USER_CACHE_TTL`` seconds.
+    """
+
+    def __init__(self, app=None):
+        self.backend = LRUBackend()
+        self.ttl = 60
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = LRUBackend(app.config.get("USER_CACHE_SIZE", 1024))
+        self.ttl = app.config.get("USER_CACHE_TTL", 60)
+        if not self._listening:
+            _listen_for_user_changes(self)
+            self._listening = True
+
+    def generation(self, id):
+        return self.backend.get(f"generation:{id}") or 0
+
+    def get(self, id, generation):
+        if not self.ttl:
+            return None
+        entry = self.backend.get(f"user:{id}")
+        if entry is None or entry[0] != generation:
+            return None
+        return entry[1]
+
+    def add(self, principal, generation):
+        if self.ttl:
+            self.backend.set(f"user:{principal.id}", (generation, principal), self.ttl)
+
+    def invalidate(self, id):
+        self.backend.incr(f"generation:{id}")
+
+
+def _listen_for_user_changes(principals):
+    from .models import User
+
+    def changed(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+    # Bump the generation only once the change is committed. A request that
+    # loaded the old row before then read the old generation too, so the
+    # snapshot it adds is ignored from here on
+    def after_commit(session):
+        for id in session.info.pop("changed_user_ids", ()):
+            principals.invalidate(id)
+
+    def after_rollback(session):
+        session.info.pop("changed_user_ids", None)
+
+    event.listen(User, "after_update", changed)
+    event.listen(User, "after_delete", changed)
+    event.listen(Session, "after_commit", after_commit)
+    event.listen(Session, "after_rollback", after_rollback)
@@ -0,0 +1,255 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from . import aggregates, search
+from .cache import invalidate_on_commit
+from .models import Category, Product
+
+OPERATIONS = ("create", "update", "delete")
+
+
+class BatchError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_item(item):
+    """Validate one batch item, returning ``(op, id, fields)``."""
+    if isinstance(item, BatchError):
+        raise item
+    if not isinstance(item, dict):
+        raise BatchError("Item must be an object")
+    op = item.get("op", "update" if "id" in item else "create")
+    if op not in OPERATIONS:
+        raise BatchError(f"Unknown op {op!r}")
+    id = item.get("id")
+    if op != "create" and not isinstance(id, int):
+        raise BatchError(f"{op} requires an integer id")
+    if op == "delete":
+        return op, id, None
+
+    name = item.get("name")
+    price = item.get("price")
+    category = item.get("category")
+    if isinstance(category, dict):
+        category = category.get("name")
+    if not isinstance(name, str) or not name:
+        raise BatchError("name must be a non-empty string")
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or price < 0:
+        raise BatchError("price must be a non-negative number")
+    if not isinstance(category, str) or not category:
+        raise BatchError("category name must be a non-empty string")
+    return op, id, {"name": name, "price": float(price), "category": category}
+
+
+def bulk_insert(model, mappings):
+    """Insert ``mappings`` with one executemany and fill in their ids."""
+    if db.session.connection().dialect.name != "sqlite":
+        db.session.bulk_insert_mappings(model, mappings, return_defaults=True)
+        return
+    # Fetching defaults would fall back to one INSERT per row. SQLite holds
+    # the write lock for the rest of the transaction once the insert starts,
+    # so the new rowids are the consecutive run ending at last_insert_rowid().
+    db.session.bulk_insert_mappings(model, mappings)
+    last = db.session.execute(text("SELECT last_insert_rowid()")).scalar()
+    for id, mapping in enumerate(mappings, start=last - len(mappings) + 1):
+        mapping["id"] = id
+
+
+def resolve_categories(names):
+    """Map category names to ids, creating missing categories, in one query
+    plus one insert.
+
+    Names are matched on their normalized form, so "Tea" and " tea" resolve
+    to the same category.
+    """
+    keys = {name: Category.normalize(name) for name in names}
+    ids = dict(
+        db.session.query(Category.name_key, Category.id).filter(
+            Category.name_key.in_(set(keys.values()))
+        )
+    )
+    missing = {}
+    for name, key in keys.items():
+        if key not in ids:
+            missing.setdefault(key, {"name": name, "name_key": key})
+    missing = list(missing.values())
+    if missing:
+        bulk_insert(Category, missing)
+        connection = db.session.connection()
+        search.index_rows(connection, Category, [(c["id"], c["name"]) for c in missing])
+        invalidate_on_commit(
+            db.session(), {"categories", *(f"category:{c['id']}" for c in missing)}
+        )
+        ids.update((c["name_key"], c["id"]) for c in missing)
+    return {name: ids[key] for name, key in keys.items()}
+
+
+def apply_chunk(chunk):
+    """Apply a list of ``(index, item)`` pairs in a single transaction.
+
+    Returns one result dict per item. Categories are resolved for the whole
+    chunk at once and products are written with bulk insert/update mappings,
+    so the statement count doesn't grow with the number of rows. If the
+    transaction fails every valid item in the chunk is reported as failed.
+    """
+    try:
+        return _apply_chunk(chunk)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        results = []
+        for index, item in chunk:
+            try:
+                parse_item(item)
+            except BatchError as error:
+                results.append(
+                    {"index": index, "status": error.status, "error": str(error)}
+                )
+            else:
+                results.append(
+                    {"index": index, "status": 500, "error": str(getattr(e, "orig", e))}
+                )
+        return results
+
+
+def _apply_chunk(chunk):
+    results = {}
+    parsed = []
+    for index, item in chunk:
+        try:
+            parsed.append((index, *parse_item(item)))
+        except BatchError as e:
+            results[index] = {"index": index, "status": e.status, "error": str(e)}
+
+    names = {fields["category"] for _, _, _, fields in parsed if fields}
+    category_ids = resolve_categories(names) if names else {}
+    ids = [id for _, op, id, _ in parsed if op != "create"]
+    existing = {
+        id: (category_id, price)
+        for id, category_id, price in db.session.query(
+            Product.id, Product.category_id, Product.price
+        ).filter(Product.id.in_(ids))
+    }
+
+    now = datetime.utcnow()
+    creates, updates, deletes = [], [], []
+    # Items apply in order, so an id that comes up twice is taken away from
+    # the aggregates as it was after the earlier item, and not at all once
+    # it has been deleted
+    current = dict(existing)
+    stats = aggregates.CategoryStats()
+    for index, op, id, fields in parsed:
+        if op != "create" and id not in current:
+            results[index] = {"index": index, "status": 404, "error": "Not found"}
+            continue
+        if op != "create":
+            stats.remove(*current.pop(id))
+        if op == "delete":
+            deletes.append((index, id))
+            continue
+        mapping = {
+            "name": fields["name"],
+            "price": fields["price"],
+            "category_id": category_ids[fields["category"]],
+            "updated_at": now,
+        }
+        stats.add(mapping["category_id"], mapping["price"])
+        if op == "create":
+            creates.append((index, mapping))
+        else:
+            mapping["id"] = id
+            current[id] = (mapping["category_id"], mapping["price"])
+            updates.append((index, mapping))
+
+    if creates:
+        mappings = [mapping for _, mapping in creates]
+        bulk_insert(Product, mappings)
+    if updates:
+        db.session.bulk_update_mappings(Product, [m for _, m in updates])
+    if deletes:
+        delete_ids = [id for _, id in deletes]
+        Product.query.filter(Product.id.in_(delete_ids)).delete(
+            synchronize_session=False
+        )
+
+    # Bulk writes skip the mapper events, so keep the search index, the
+    # category aggregates and the fragment cache in step here
+    connection = db.session.connection()
+    written = [mapping for _, mapping in creates + updates]
+    search.index_rows(connection, Product, [(m["id"], m["name"]) for m in written])
+    search.remove_rows(connection, Product, [id for _, id in deletes])
+    stats.apply(connection)
+    tags = {"products", "category-stats"}
+    for mapping in written:
+        tags.update({f"product:{mapping['id']}", f"category:{mapping['category_id']}"})
+    for id in [m["id"] for _, m in updates] + [id for _, id in deletes]:
+        tags.update({f"product:{id}", f"category:{existing[id][0]}"})
+    invalidate_on_commit(db.session(), tags)
+    db.session.commit()
+
+    for index, mapping in creates:
+        results[index] = {"index": index, "status": 201, "id": mapping["id"]}
+    for index, mapping in updates:
+        results[index] = {"index": index, "status": 200, "id": mapping["id"]}
+    for index, id in deletes:
+        results[index] = {"index": index, "status": 204, "id": id}
+    return [results[index] for index, _ in chunk]
+
+
+def iter_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Report the bad line in its slot instead of failing the batch
+                yield BatchError("Invalid JSON")
+
+
+def apply_batch(items, chunk_size):
+    """Apply ``items`` in chunks of ``chunk_size``, one transaction each, and
+    yield the per-item results in order."""
+    chunk = []
+    for index, item in enumerate(items):
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield from apply_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from apply_chunk(chunk)
+
+
+def update_products(ids, values):
+    """Apply ``values`` to the products ``ids`` with a single UPDATE and
+    commit, returning the number of rows changed.
+
+    ``values`` may hold SQL expressions, such as a price computed from the
+    current one.
+    """
+    ids = list(ids)
+    category_ids = {
+        category_id
+        for category_id, in db.session.query(Product.category_id)
+        .filter(Product.id.in_(ids))
+        .distinct()
+    }
+    count = Product.query.filter(Product.id.in_(ids)).update(
+        values, synchronize_session=False
+    )
+    # Names don't change here, so the search index is still current, but
+    # the aggregates of the categories involved and the fragments listing
+    # these products are not
+    category_ids.add(values.get("category_id"))
+    category_ids.discard(None)
+    aggregates.reconcile(db.session.connection(), category_ids)
+    tags = {"products", "category-stats", *(f"product:{id}" for id in ids)}
+    tags.update(f"category:{id}" for id in category_ids)
+    invalidate_on_commit(db.session(), tags)
+    db.session.commit()
+    return count
@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import OrderedDict
+
+from blinker import Namespace
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+signals = Namespace()
+# Sent with hit=True or hit=False on every FragmentCache lookup
+fragment_lookup = signals.signal("fragment-lookup")
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def incr(self, key):
+        return 0
+
+
+class LRUBackend:
+    """In-process LRU cache with a per-entry TTL.
+
+    Each gunicorn worker has its own copy, so an invalidation only reaches
+    the worker that made the change; use a shared backend with several
+    workers.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        # Counters live outside the LRU so that evicting a tag version can't
+        # bring stale entries back to life
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Shared backend for any client with the redis-py ``get``/``set``/
+    ``delete``/``incr`` API, so tests can pass an in-memory stand-in."""
+
+    def __init__(self, client, prefix="vanilla:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+class FragmentCache:
+    """Caches rendered template fragments under a set of tags.
+
+    Every tag has a version number that is part of the cache key, so
+    invalidating a tag just bumps its version and the stale entries age out
+    of the backend.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get("CACHE_TYPE", "lru")
+        if backend == "lru":
+            backend = LRUBackend(app.config.get("CACHE_MAXSIZE", 1024))
+        elif backend == "redis":
+            backend = RedisBackend.from_url(app.config["CACHE_REDIS_URL"])
+        elif backend == "null":
+            backend = NullBackend()
+        self.backend = backend
+        self.ttl = app.config.get("CACHE_DEFAULT_TIMEOUT", 300)
+        app.extensions["fragment_cache"] = self
+        if not self._listening:
+            _listen_for_changes(self)
+            self._listening = True
+
+    @property
+    def is_local(self):
+        # Invalidations made in another process, such as a CLI command,
+        # don't reach this process's LRU
+        return isinstance(self.backend, LRUBackend)
+
+    def cached(self, key, tags, render):
+        versions = ",".join(str(self.version(tag)) for tag in tags)
+        key = f"fragment:{key}:{versions}"
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(hit=True)
+            return value
+        self._count(hit=False)
+        value = render()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(f"tag:{tag}")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def version(self, tag):
+        return self.backend.get(f"tag:{tag}") or 0
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        fragment_lookup.send(self, hit=hit)
+
+
+def invalidate_on_commit(session, tags):
+    """Invalidate ``tags`` once ``session`` commits, for writes that bypass
+    the mapper events."""
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+def product_tags(product):
+    tags = {"products", f"product:{product.id}"}
+    # Both the old and the new category page list this product
+    history = inspect(product).attrs.category_id.history
+    for category_id in (product.category_id, *history.deleted):
+        if category_id is not None:
+            tags.add(f"category:{category_id}")
+    return tags
+
+
+def category_tags(category):
+    return {"categories", f"category:{category.id}"}
+
+
+def _listen_for_changes(cache):
+    from .models import Category, Product
+
+    def collect(tags_for):
+        def _collect(mapper, connection, target):
+            session = object_session(target)
+            if session is not None:
+                invalidate_on_commit(session, tags_for(target))
+
+        return _collect
+
+    # Tags are collected during the flush but only invalidated once the
+    # transaction commits, so a concurrent request can't cache the old rows
+    # again in between.
+    def after_commit(session):
+        tags = session.info.pop("cache_tags", None)
+        if tags:
+            cache.invalidate(*tags)
+
+    def after_rollback(session):
+        session.info.pop("cache_tags", None)
+
+    for model, tags_for in ((Product, product_tags), (Category, category_tags)):
+        for name in ("after_insert", "after_update", "after_delete"):
+            event.listen(model, name, collect(tags_for))
+    event.listen(Session, "after_commit", after_commit)
+    event.listen(Session, "after_rollback", after_rollback)
@@ -0,0 +1,124 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+
+catalog = AppGroup("catalog", help="Manage the product catalog.")
+assets_cli = AppGroup("assets", help="Build static assets.")
+
+
+@catalog.command("reindex")
+def reindex():
+    """Rebuild the full-text search index from the catalog tables."""
+    from . import search
+
+    with db.engine.begin() as connection:
+        counts = search.rebuild(connection)
+    for table, count in counts.items():
+        click.echo(f"Indexed {count} rows from {table}")
+
+
+@catalog.command("reconcile")
+def reconcile():
+    """Recompute the per-category product counts and prices."""
+    from app import cache
+    from . import aggregates
+
+    with db.engine.begin() as connection:
+        count = aggregates.reconcile(connection)
+    cache.invalidate("category-stats")
+    click.echo(f"Updated the aggregates of {count} categories with products")
+    warn_if_cache_is_local()
+
+
+@catalog.command("check-plans")
+def check_plans():
+    """Fail if a hot query would read a whole table instead of an index."""
+    from . import plans
+
+    with db.engine.connect() as connection:
+        results = plans.check_plans(connection)
+    if results is None:
+        click.echo(f"Skipped: no plan check for {db.engine.dialect.name}")
+        return
+    for name, scans in results.items():
+        status = f"full scan of {', '.join(scans)}" if scans else "ok"
+        click.echo(f"{name}: {status}")
+    if any(results.values()):
+        raise SystemExit(1)
+
+
+@catalog.command("export")
+@click.option(
+    "--format",
+    "format",
+    type=click.Choice(["ndjson", "csv"]),
+    default="ndjson",
+    show_default=True,
+)
+@click.option("--output", type=click.File("wb"), default="-", show_default=True)
+@click.option("--batch-size", type=int, default=1000, show_default=True)
+def export_products(format, output, batch_size):
+    """Stream every product with its category name to a file or stdout."""
+    from . import export
+
+    for chunk in export.iter_export(format, batch_size):
+        output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+
+@catalog.command("import")
+@click.argument("source", type=click.File("r"), default="-")
+@click.option(
+    "--format",
+    "format",
+    type=click.Choice(["ndjson", "csv"]),
+    help="Input format. Guessed from the file extension when not given.",
+)
+@click.option("--batch-size", type=int, default=10000, show_default=True)
+def import_products(source, format, batch_size):
+    """Load products from a CSV or NDJSON file, or stdin.
+
+    Rows need name, price and category columns (or keys); categories that
+    don't exist yet are created.
+    """
+    from . import importer
+
+    if format is None:
+        format = "csv" if source.name.endswith(".csv") else "ndjson"
+    reader = importer.read_csv if format == "csv" else importer.read_ndjson
+
+    def progress(run):
+        click.echo(f"{run.imported} products imported ({run.rate:.0f}/s)", err=True)
+
+    run = importer.Importer(batch_size, progress).run(reader(source))
+    for line, error in run.errors[:20]:
+        click.echo(f"Skipped row {line}: {error}", err=True)
+    click.echo(
+        f"Imported {run.imported} products, skipped {run.skipped} "
+        f"({run.rate:.0f} rows/s)"
+    )
+    warn_if_cache_is_local()
+
+
+def warn_if_cache_is_local():
+    from app import cache
+
+    if cache.is_local:
+        click.echo(
+            "Warning: the fragment cache is local to each process, so running "
+            "web workers keep serving cached pages until they expire "
+            "(CACHE_DEFAULT_TIMEOUT). Use CACHE_TYPE=redis to share "
+            "invalidations.",
+            err=True,
+        )
+
+
+@assets_cli.command("build")
+def build_assets():
+    """Fingerprint and precompress the files in app/static."""
+    from .assets import build
+
+    manifest = build(current_app.static_folder)
+    current_app.extensions["assets"].load_manifest(current_app)
+    click.echo(f"Built {len(manifest)} assets")
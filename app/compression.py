@@ -0,0 +1,180 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/csv",
+    "text/xml",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        self.obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.obj.compress(data)
+
+    def flush(self):
+        return self.obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.obj.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level):
+        self.obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.obj.process(data)
+
+    def flush(self):
+        return self.obj.flush()
+
+    def finish(self):
+        return self.obj.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level):
+        self.obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.obj.compress(data)
+
+    def flush(self):
+        return self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.obj.flush()
+
+
+def available_encoders():
+    """Encoders whose library is installed, in order of preference."""
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = ZstdEncoder
+    if brotli is not None:
+        encoders["br"] = BrotliEncoder
+    encoders["gzip"] = GzipEncoder
+    return encoders
+
+
+def compress(encoding, data, level):
+    encoder = available_encoders()[encoding](level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def compress_stream(chunks, encoder):
+    # Flush after every chunk so a streamed response still arrives in
+    # pieces rather than once the compressor's buffer fills up
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+class Compression:
+    """Compresses HTML, JSON and other text responses.
+
+    The encoding is negotiated from ``Accept-Encoding`` among zstd and
+    Brotli, when their packages are installed, and gzip. Bodies shorter than
+    ``COMPRESS_MIN_SIZE`` are sent as they are, and streamed responses are
+    compressed chunk by chunk. Files sent by ``send_file``, such as static
+    assets with their own precompressed copies and uploaded images, are
+    left alone.
+    """
+
+    def __init__(self, app=None):
+        self.encoders = {}
+        self.levels = {}
+        self.min_size = 500
+        self.mimetypes = COMPRESSIBLE
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.encoders = available_encoders()
+        self.levels = {
+            "gzip": app.config.get("COMPRESS_GZIP_LEVEL", 6),
+            "br": app.config.get("COMPRESS_BR_LEVEL", 4),
+            "zstd": app.config.get("COMPRESS_ZSTD_LEVEL", 3),
+        }
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 500)
+        self.mimetypes = app.config.get("COMPRESS_MIMETYPES", COMPRESSIBLE)
+        app.extensions["compression"] = self
+        if app.config.get("COMPRESS_ENABLED", True):
+            app.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        encoding = request.accept_encodings.best_match(list(self.encoders))
+        if (
+            response.mimetype not in self.mimetypes
+            or response.direct_passthrough
+            or "no-transform" in response.headers.get("Cache-Control", "")
+        ):
+            return response
+        if response.status_code == 304:
+            # Carry the same validator as the 200 would have
+            if encoding is not None:
+                response.vary.add("Accept-Encoding")
+                weaken_etag(response)
+            return response
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 206)
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        if encoding is None:
+            return response
+        # A 304 can't tell whether the body would have been compressed, so
+        # the validator is weak whenever it could have been
+        weaken_etag(response)
+        encoder = self.encoders[encoding](self.levels[encoding])
+        if not response.is_streamed:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(encoder.compress(data) + encoder.finish())
+        else:
+            response.response = compress_stream(response.response, encoder)
+            response.headers.pop("Content-Length", None)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+def weaken_etag(response):
+    # The compressed body is a different sequence of bytes, so a strong
+    # validator for the original no longer applies
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
@@ -0,0 +1,44 @@
+import hashlib
+from datetime import timezone
+
+from flask import make_response, request
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return digest[:32]
+
+
+def latest(*timestamps):
+    timestamps = [t for t in timestamps if t is not None]
+    return max(timestamps) if timestamps else None
+
+
+def is_not_modified(etag, last_modified=None):
+    """Check the request's validators before any work goes into a response.
+
+    As in RFC 7232, ``If-None-Match`` wins over ``If-Modified-Since`` when a
+    client sends both.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+        since = request.if_modified_since
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def not_modified_response(etag, last_modified=None, headers=None):
+    response = make_response("", 304, headers or {})
+    set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return response
@@ -0,0 +1,129 @@
+import os
+import weakref
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+REPLICA = "replica"
+
+
+def database_url(url):
+    # Heroku still hands out postgres:// URLs, which SQLAlchemy 1.4 rejects
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://") :]
+    return url
+
+
+def engine_options(config):
+    """Build ``SQLALCHEMY_ENGINE_OPTIONS`` from the ``DATABASE_*`` settings."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # Flask-SQLAlchemy uses a single static connection for these
+        return {}
+    options = {
+        "pool_size": config["DATABASE_POOL_SIZE"],
+        "max_overflow": config["DATABASE_MAX_OVERFLOW"],
+        "pool_timeout": config["DATABASE_POOL_TIMEOUT"],
+    }
+    if url.get_backend_name() == "sqlite":
+        # Flask-SQLAlchemy would pick NullPool, reopening the file (and
+        # rerunning the pragmas) on every checkout. Pooled connections are
+        # handed between threads, one at a time.
+        options["poolclass"] = QueuePool
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_recycle"] = config["DATABASE_POOL_RECYCLE"]
+        options["pool_pre_ping"] = config["DATABASE_POOL_PRE_PING"]
+    return options
+
+
+def sqlite_pragmas(config):
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": config["SQLITE_BUSY_TIMEOUT"],
+        "mmap_size": config["SQLITE_MMAP_SIZE"],
+    }
+
+
+def app_engines(app, db):
+    binds = [None] + ([REPLICA] if REPLICA in app.config["SQLALCHEMY_BINDS"] else [])
+    return [db.get_engine(app, bind=bind) for bind in binds]
+
+
+def dispose_engines(app, db):
+    for engine in app_engines(app, db):
+        engine.dispose()
+
+
+# Engines whose pools are reset in forked children. Weak, so engines of
+# discarded apps (tests, benchmarks) can still be collected.
+_engines = weakref.WeakSet()
+
+
+def _reset_pools_in_child():
+    for engine in list(_engines):
+        # The child must not close the parent's connections, only forget them
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_pools_in_child)
+
+
+def configure_engines(app, db):
+    """Run the SQLite pragmas on every new connection of the app's engines,
+    and give forked processes (gunicorn --preload) fresh connection pools.
+
+    Must be called before the engines hand out their first connection.
+    """
+    pragmas = sqlite_pragmas(app.config)
+    for engine in app_engines(app, db):
+        _engines.add(engine)
+        if engine.dialect.name != "sqlite":
+            continue
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+
+class RoutingSession(SignallingSession):
+    """Sends reads made inside :func:`read_only` views to the replica.
+
+    Flushes always go to the primary, as does everything else when no
+    ``replica`` bind is configured.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            not self._flushing
+            and has_app_context()
+            and g.get("read_replica")
+            and REPLICA in self.app.config["SQLALCHEMY_BINDS"]
+        ):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def read_only(view):
+    """Let ``view`` read from the replica database, if one is configured."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,63 @@
+import csv
+import io
+
+from app import db
+from .models import Category, Product
+from .serializers import dumps
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+FIELDS = ("id", "name", "price", "category")
+
+
+def iter_rows(batch_size=1000):
+    """Yield catalog rows as plain tuples, fetching ``batch_size`` at a time.
+
+    The category name is joined in SQL and no ORM objects are built. Where
+    the driver supports it the rows come from a server-side cursor, so
+    memory use doesn't depend on the size of the catalog.
+    """
+    query = (
+        db.session.query(Product.id, Product.name, Product.price, Category.name)
+        .outerjoin(Category, Product.category_id == Category.id)
+        .order_by(Product.id)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    yield from query
+
+
+def iter_batches(rows, batch_size=1000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_ndjson(rows, batch_size=1000):
+    for batch in iter_batches(rows, batch_size):
+        yield b"".join(dumps(dict(zip(FIELDS, row))) + b"\n" for row in batch)
+
+
+def iter_csv(rows, batch_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    # Send the header straight away so the client sees the first byte before
+    # the first batch is fetched
+    yield buffer.getvalue()
+    for batch in iter_batches(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def iter_export(format, batch_size=1000):
+    rows = iter_rows(batch_size)
+    if format == "csv":
+        return iter_csv(rows, batch_size)
+    return iter_ndjson(rows, batch_size)
@@ -2,15 +2,17 @@ from decimal import Decimal
 
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileRequired
-from wtforms import StringField, DecimalField, SelectField
+from wtforms import DecimalField, HiddenField, SelectField, StringField
 from wtforms.validators import InputRequired, NumberRange, ValidationError
 
+from app import category_registry
 from .models import Category
 
 
 def check_duplicate_category():
     def _check_duplicate(form, field):
-        res = Category.query.filter(Category.name.ilike("%" + field.data + "%")).first()
+        key = Category.normalize(field.data)
+        res = Category.query.filter_by(name_key=key).first()
         if res:
             raise ValidationError(f"Category named {field.data} already exists")
 
@@ -18,16 +20,14 @@ def check_duplicate_category():
 
 
 class CategoryField(SelectField):
+    """Select field whose choices come from the category registry."""
+
     def iter_choices(self):
-        categories = [(c.id, c.name) for c in Category.query.all()]
-        for value, label in categories:
+        for value, label in category_registry.names().items():
             yield (value, label, self.coerce(value) == self.data)
 
     def pre_validate(self, form):
-        for v, _ in [(c.id, c.name) for c in Category.query.all()]:
-            if self.data == v:
-                break
-        else:
+        if self.data is None or not category_registry.exists(self.data):
             raise ValueError(self.gettext("Not a valid choice"))
 
 
@@ -49,3 +49,21 @@ class CategoryForm(NameForm):
 
 class SearchForm(FlaskForm):
     query = StringField("Query", validators=[InputRequired()])
+
+
+class BulkPriceForm(FlaskForm):
+    ids = HiddenField()
+    mode = SelectField(
+        "Change", choices=[("set", "Set price to"), ("percent", "Adjust by %")]
+    )
+    amount = DecimalField("Amount", validators=[InputRequired()])
+
+    def validate_amount(self, field):
+        minimum = 0 if self.mode.data == "set" else -100
+        if field.data < minimum:
+            raise ValidationError(f"Must be at least {minimum}")
+
+
+class BulkCategoryForm(FlaskForm):
+    ids = HiddenField()
+    category = CategoryField("Category", validators=[InputRequired()], coerce=int)
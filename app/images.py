@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# name -> longest side in pixels
+VARIANTS = {"thumb": 320, "medium": 1024}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def save_upload(storage, upload_folder, extension):
+    """Stream an uploaded file to disk under a name derived from its content.
+
+    The file is hashed while it is copied, so identical uploads share one
+    file and the name can be cached forever. Returns the new filename.
+    """
+    digest = hashlib.sha256()
+    os.makedirs(upload_folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in iter(lambda: storage.stream.read(64 * 1024), b""):
+                digest.update(chunk)
+                tmp.write(chunk)
+        filename = f"{digest.hexdigest()[:32]}.{extension}"
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename
+
+
+def variant_name(filename, variant):
+    return f"{filename.rsplit('.', 1)[0]}-{variant}.webp"
+
+
+def existing_variants(filename, upload_folder):
+    variants = {}
+    for variant in VARIANTS:
+        name = variant_name(filename, variant)
+        if os.path.exists(os.path.join(upload_folder, name)):
+            variants[variant] = name
+    return variants
+
+
+def generate_variants(filename, upload_folder):
+    """Write a resized WebP copy of ``filename`` for each variant."""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow is not installed; not generating image variants")
+        return {}
+
+    variants = {}
+    with Image.open(os.path.join(upload_folder, filename)) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        for variant, size in VARIANTS.items():
+            name = variant_name(filename, variant)
+            path = os.path.join(upload_folder, name)
+            if not os.path.exists(path):
+                copy = image.copy()
+                copy.thumbnail((size, size))
+                # Write to a temporary name so a half-written file is never
+                # served under the final one
+                fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix=".part")
+                with os.fdopen(fd, "wb") as tmp:
+                    copy.save(tmp, "WEBP", quality=80, method=4)
+                os.replace(tmp_path, path)
+            variants[variant] = name
+    return variants
+
+
+def record_variants(filename, variants):
+    for product in Product.query.filter_by(image_path=filename):
+        product.image_variants = variants
+    db.session.commit()
+
+
+def process_image(app, filename):
+    with app.app_context():
+        try:
+            variants = generate_variants(filename, app.config["UPLOAD_FOLDER"])
+            if variants:
+                record_variants(filename, variants)
+        except Exception:
+            logger.exception("Generating variants for %s failed", filename)
+        finally:
+            db.session.remove()
+
+
+def get_executor(app):
+    # Created on first use so that each forked gunicorn worker gets its own
+    # threads instead of inheriting dead ones from the master
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config["IMAGE_WORKERS"],
+                thread_name_prefix="image-worker",
+            )
+        return _executor
+
+
+def schedule(app, filename):
+    """Generate variants for ``filename`` in the background and record them
+    on every product using it.
+
+    With ``IMAGE_WORKERS`` set to 0 the work happens inline instead.
+    """
+    upload_folder = app.config["UPLOAD_FOLDER"]
+    variants = existing_variants(filename, upload_folder)
+    if len(variants) < len(VARIANTS) and not app.config["IMAGE_WORKERS"]:
+        # The product is already saved, so like the worker path don't let
+        # a bad image fail the request
+        try:
+            variants = generate_variants(filename, upload_folder)
+        except Exception:
+            logger.exception("Generating variants for %s failed", filename)
+            return None
+    if len(variants) == len(VARIANTS) or not app.config["IMAGE_WORKERS"]:
+        record_variants(filename, variants)
+        return None
+    return get_executor(app).submit(process_image, app, filename)
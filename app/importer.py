@@ -0,0 +1,159 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+
+from app import cache, db
+from . import aggregates, search
+from .batch import BatchError, parse_item
+from .models import Category, Product
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        try:
+            row["price"] = float(row.get("price") or "")
+        except ValueError:
+            pass
+        yield row
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield BatchError("Invalid JSON")
+
+
+@contextmanager
+def sqlite_bulk_load(connection):
+    """Relax SQLite's durability settings for the length of a bulk load.
+
+    ``synchronous=NORMAL`` only syncs at checkpoints instead of on every
+    commit, which is safe against corruption in WAL mode (set on every
+    connection by :func:`app.database.configure_engines`); a power cut can
+    at worst lose the last batches, which the import can simply be rerun
+    for. The connection's previous settings are put back afterwards, as it
+    returns to the pool.
+    """
+    if connection.dialect.name != "sqlite":
+        yield
+        return
+    pragmas = {"synchronous": "NORMAL", "cache_size": -65536, "temp_store": "MEMORY"}
+    previous = {
+        name: connection.execute(text(f"PRAGMA {name}")).scalar() for name in pragmas
+    }
+    for name, value in pragmas.items():
+        connection.execute(text(f"PRAGMA {name}={value}"))
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            connection.execute(text(f"PRAGMA {name}={int(value)}"))
+
+
+class Importer:
+    """Insert products from an iterable of dicts in batches.
+
+    Categories are matched by normalized name against an in-memory map
+    loaded once up front, and only the missing ones are inserted. Products
+    are written with a single executemany per batch and each batch is its
+    own transaction.
+    Everything runs on one connection so the load pragmas stay in effect.
+    """
+
+    def __init__(self, batch_size=10000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.categories = {}
+        self.touched_categories = set()
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = None
+
+    def run(self, items):
+        self.started = time.perf_counter()
+        with db.engine.connect() as connection, sqlite_bulk_load(connection):
+            query = select(Category.name_key, Category.id)
+            self.categories = dict(connection.execute(query).all())
+            last_ids = {
+                model: connection.execute(select(func.max(model.id))).scalar()
+                for model in search.indexed_models
+            }
+            batch = []
+            for line, item in enumerate(items, start=1):
+                try:
+                    if isinstance(item, dict):
+                        item = {**item, "op": "create"}
+                    _, _, fields = parse_item(item)
+                except BatchError as e:
+                    self.skipped += 1
+                    self.errors.append((line, str(e)))
+                    continue
+                batch.append(fields)
+                if len(batch) >= self.batch_size:
+                    self.write(connection, batch)
+                    batch = []
+            if batch:
+                self.write(connection, batch)
+            # Indexing the new rows in one pass beats indexing row by row
+            with connection.begin():
+                search.rebuild(connection, last_ids)
+        cache.invalidate(
+            "products",
+            "categories",
+            "category-stats",
+            *(f"category:{id}" for id in self.touched_categories),
+        )
+        return self
+
+    def write(self, connection, batch):
+        now = datetime.utcnow()
+        with connection.begin():
+            keys = [Category.normalize(f["category"]) for f in batch]
+            missing = {}
+            for f, key in zip(batch, keys):
+                if key not in self.categories:
+                    missing.setdefault(key, f["category"])
+            if missing:
+                connection.execute(
+                    Category.__table__.insert(),
+                    [
+                        {"name": name, "name_key": key, "updated_at": now}
+                        for key, name in missing.items()
+                    ],
+                )
+                query = select(Category.name_key, Category.id).where(
+                    Category.name_key.in_(missing)
+                )
+                self.categories.update(connection.execute(query).all())
+            rows = [
+                {
+                    "name": f["name"],
+                    "price": f["price"],
+                    "category_id": self.categories[key],
+                    "updated_at": now,
+                }
+                for f, key in zip(batch, keys)
+            ]
+            connection.execute(Product.__table__.insert(), rows)
+            stats = aggregates.CategoryStats()
+            for row in rows:
+                stats.add(row["category_id"], row["price"])
+            stats.apply(connection)
+        self.touched_categories.update(row["category_id"] for row in rows)
+        self.imported += len(rows)
+        if self.progress:
+            self.progress(self)
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.imported / elapsed if elapsed else 0.0
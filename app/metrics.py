@@ -0,0 +1,177 @@
+import hmac
+import os
+import time
+
+from flask import (
+    Response,
+    abort,
+    before_render_template,
+    current_app,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .cache import fragment_lookup
+from .ratelimit import request_shed
+
+
+class RequestStats:
+    """What one request spent its time on, for the ``Server-Timing`` header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_starts = []
+
+
+class Metrics:
+    """Prometheus metrics for requests, SQL, templates and the fragment cache.
+
+    Under gunicorn set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory
+    before the workers start: each worker then writes its samples there and
+    ``/metrics`` adds them up, whichever worker answers the scrape.
+    """
+
+    def __init__(self, app=None):
+        self.registry = CollectorRegistry(auto_describe=True)
+        self.request_duration = Histogram(
+            "http_request_duration_seconds",
+            "Time spent handling a request, by endpoint",
+            ["endpoint", "method", "status"],
+            registry=self.registry,
+        )
+        self.sql_statements = Counter(
+            "sql_statements",
+            "SQL statements executed, by endpoint",
+            ["endpoint"],
+            registry=self.registry,
+        )
+        self.sql_duration = Counter(
+            "sql_duration_seconds",
+            "Time spent executing SQL statements, by endpoint",
+            ["endpoint"],
+            registry=self.registry,
+        )
+        self.template_duration = Histogram(
+            "template_render_duration_seconds",
+            "Time spent rendering a template, including the templates it includes",
+            ["template"],
+            registry=self.registry,
+        )
+        self.cache_lookups = Counter(
+            "fragment_cache_lookups",
+            "Fragment cache lookups, by result",
+            ["result"],
+            registry=self.registry,
+        )
+        self.shed_requests = Counter(
+            "shed_requests",
+            "API requests turned away by the rate limiter, by reason",
+            ["reason"],
+            registry=self.registry,
+        )
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["metrics"] = self
+        if not app.config.get("METRICS_ENABLED", True):
+            return
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        app.add_url_rule("/metrics", "metrics", self.export)
+        if not self._listening:
+            event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+            before_render_template.connect(self.before_render, weak=False)
+            template_rendered.connect(self.after_render, weak=False)
+            fragment_lookup.connect(self.count_lookup, weak=False)
+            request_shed.connect(self.count_shed, weak=False)
+            self._listening = True
+
+    def start_request(self):
+        g.request_stats = RequestStats()
+
+    def finish_request(self, response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or "none"
+        elapsed = time.perf_counter() - stats.started
+        self.request_duration.labels(
+            endpoint, request.method, response.status_code
+        ).observe(elapsed)
+        if stats.sql_count:
+            self.sql_statements.labels(endpoint).inc(stats.sql_count)
+            self.sql_duration.labels(endpoint).inc(stats.sql_time)
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.sql_count} queries", '
+            f"tpl;dur={stats.template_time * 1000:.1f}, "
+            f"app;dur={elapsed * 1000:.1f}",
+        )
+        return response
+
+    def export(self):
+        # Without a token, only scrapers on the same host get the metrics
+        token = current_app.config.get("METRICS_TOKEN")
+        if token:
+            expected = f"Bearer {token}".encode()
+            given = request.headers.get("Authorization", "").encode()
+            if not hmac.compare_digest(given, expected):
+                abort(404)
+        elif request.remote_addr not in ("127.0.0.1", "::1"):
+            abort(404)
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = self.registry
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        conn.info.setdefault("query_starts", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, *args):
+        elapsed = time.perf_counter() - conn.info["query_starts"].pop()
+        stats = g.get("request_stats") if has_request_context() else None
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += elapsed
+
+    def before_render(self, app, template, context):
+        stats = g.get("request_stats") if has_request_context() else None
+        if stats is not None:
+            stats.template_starts.append(time.perf_counter())
+
+    def after_render(self, app, template, context):
+        stats = g.get("request_stats") if has_request_context() else None
+        if stats is None or not stats.template_starts:
+            return
+        elapsed = time.perf_counter() - stats.template_starts.pop()
+        self.template_duration.labels(template.name).observe(elapsed)
+        # Only count the outermost template so nested renders (a cached
+        # fragment inside the page) aren't added twice
+        if not stats.template_starts:
+            stats.template_time += elapsed
+
+    def count_lookup(self, cache, hit):
+        self.cache_lookups.labels("hit" if hit else "miss").inc()
+
+    def count_shed(self, limiter, reason):
+        self.shed_requests.labels(reason).inc()
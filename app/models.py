@@ -1,32 +1,84 @@
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy.orm import validates
+
 from app import db
 
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255))
+    name = db.Column(db.String(255), index=True)
     price = db.Column(db.Float)
     image_path = db.Column(db.String(255))
+    # Resized copies of the image by variant name, filled in in the background
+    image_variants = db.Column(db.JSON)
     category_id = db.Column(db.Integer, db.ForeignKey("category.id"))
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
     category = db.relationship(
         "Category", backref=db.backref("products", lazy="dynamic")
     )
 
+    # Also covers the ORDER BY id of a category's keyset pages
+    __table_args__ = (
+        db.Index("ix_product_category_id", category_id, id),
+        # Answers a category's min/max price from the index
+        db.Index("ix_product_category_price", category_id, price),
+    )
+
     def __init__(self, name, price, category, image_path):
         self.name = name
         self.price = price
-        self.category = category
+        # A bare id links the category without loading it
+        if isinstance(category, int):
+            self.category_id = category
+        else:
+            self.category = category
         self.image_path = image_path
 
     def __repr__(self):
         return f"{self.name}"
 
+    def image_url(self, variant=None):
+        filename = (self.image_variants or {}).get(variant) or self.image_path
+        if filename:
+            return url_for("static", filename="uploads/" + filename)
+        return None
+
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(255))
+    name = db.Column(db.String(255), index=True)
+    # The name as compared for uniqueness: case-folded, whitespace collapsed
+    name_key = db.Column(db.String(255), nullable=False, index=True, unique=True)
+    # Aggregates over the category's products, maintained by app.aggregates
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    price_min = db.Column(db.Float)
+    price_max = db.Column(db.Float)
+    price_total = db.Column(db.Float, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
     def __init__(self, name):
         self.name = name
 
+    @property
+    def price_avg(self):
+        if self.product_count:
+            return self.price_total / self.product_count
+        return None
+
+    @staticmethod
+    def normalize(name):
+        return " ".join(name.split()).casefold()
+
+    @validates("name")
+    def validate_name(self, key, name):
+        self.name_key = self.normalize(name or "")
+        return name
+
     def __repr__(self):
         return f"{self.name}"
@@ -0,0 +1,108 @@
+import random
+
+from flask import before_render_template, g, template_rendered
+from werkzeug.exceptions import HTTPException
+
+_sampler = None
+
+
+def parse_sample_rates(value):
+    """Parse ``"endpoint=rate,endpoint=rate"`` into a dict."""
+    rates = {}
+    for item in (value or "").split(","):
+        if item.strip():
+            endpoint, rate = item.split("=")
+            rates[endpoint.strip()] = float(rate)
+    return rates
+
+
+class Sampler:
+    """Decides which requests are traced.
+
+    Each endpoint is traced at its rate from ``SENTRY_ENDPOINT_SAMPLE_RATES``
+    or else at ``SENTRY_TRACES_SAMPLE_RATE``. With ``SENTRY_SLOW_REQUEST_MS``
+    set, every request with a non-zero rate is traced and the finished
+    transactions are sampled instead, keeping all the slow ones.
+    """
+
+    def __init__(self, app):
+        self.url_map = app.url_map
+        self.default_rate = app.config["SENTRY_TRACES_SAMPLE_RATE"]
+        self.rates = app.config["SENTRY_ENDPOINT_SAMPLE_RATES"]
+        self.slow = app.config["SENTRY_SLOW_REQUEST_MS"] / 1000
+
+    def rate(self, endpoint):
+        return self.rates.get(endpoint, self.default_rate)
+
+    def endpoint(self, environ):
+        try:
+            return self.url_map.bind_to_environ(environ).match()[0]
+        except HTTPException:
+            return None
+
+    def traces_sampler(self, sampling_context):
+        if sampling_context.get("parent_sampled") is not None:
+            return sampling_context["parent_sampled"]
+        environ = sampling_context.get("wsgi_environ")
+        rate = self.rate(self.endpoint(environ) if environ else None)
+        if self.slow and rate > 0:
+            return 1.0
+        return rate
+
+    def keep_transaction(self, event, hint):
+        if event.get("type") != "transaction" or not self.slow:
+            return event
+        duration = event["timestamp"] - event["start_timestamp"]
+        if duration.total_seconds() >= self.slow:
+            return event
+        if random.random() < self.rate(event.get("transaction")):
+            return event
+        return None
+
+
+def init_sentry(app):
+    """Set up Sentry error reporting and tracing if ``SENTRY_DSN`` is set.
+
+    sentry_sdk and its background thread are only loaded when enabled.
+    ``SENTRY_TRANSPORT``, passed in the config given to ``create_app``, can
+    replace the HTTP transport, e.g. with a ``sentry_sdk.transport.Transport``
+    subclass that keeps envelopes locally.
+    """
+    if not app.config["SENTRY_DSN"]:
+        return
+    import sentry_sdk
+    from sentry_sdk.integrations.flask import FlaskIntegration
+    from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+    from sentry_sdk.scope import add_global_event_processor
+
+    global _sampler
+    if _sampler is None:
+        add_global_event_processor(keep_transaction)
+        before_render_template.connect(start_template_span, weak=False)
+        template_rendered.connect(finish_template_span, weak=False)
+    _sampler = Sampler(app)
+    sentry_sdk.init(
+        dsn=app.config["SENTRY_DSN"],
+        integrations=[FlaskIntegration(), SqlalchemyIntegration()],
+        traces_sampler=_sampler.traces_sampler,
+        transport=app.config.get("SENTRY_TRANSPORT"),
+    )
+
+
+def keep_transaction(event, hint):
+    return _sampler.keep_transaction(event, hint)
+
+
+def start_template_span(app, template, context):
+    import sentry_sdk
+
+    span = sentry_sdk.Hub.current.scope.span
+    if span is not None:
+        child = span.start_child(op="template.render", description=template.name)
+        g.setdefault("sentry_template_spans", []).append(child)
+
+
+def finish_template_span(app, template, context):
+    spans = g.get("sentry_template_spans")
+    if spans:
+        spans.pop().finish()
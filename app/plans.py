@@ -0,0 +1,70 @@
+from sqlalchemy import func, select, text
+
+from .models import Category, Product
+from .auth.models import OAuth, User
+
+# Databases whose query plans full_scans can read
+DIALECTS = ("sqlite", "postgresql")
+
+
+def hot_queries():
+    """The lookups on request paths that must be answered from an index."""
+    return {
+        "category page": select(Product.id)
+        .where(Product.category_id == 1)
+        .order_by(Product.id)
+        .limit(12),
+        "category price range": select(func.min(Product.price)).where(
+            Product.category_id == 1
+        ),
+        "product by name": select(Product.id).where(Product.name == "x"),
+        "category by name": select(Category.id).where(Category.name == "x"),
+        "category by normalized name": select(Category.id).where(
+            Category.name_key == "x"
+        ),
+        "user by username": select(User.id).where(User.username == "x"),
+        "oauth account": select(OAuth.id).where(
+            OAuth.provider == "github", OAuth.provider_user_id == "1"
+        ),
+    }
+
+
+def full_scans(connection, statement):
+    """Return the tables the database would read in full for ``statement``."""
+    sql = str(
+        statement.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+    if connection.dialect.name == "sqlite":
+        plan = connection.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+        # "SCAN product" reads the table; "SCAN ... USING INDEX" and
+        # "SEARCH ..." don't
+        return [
+            row.detail.split()[1]
+            for row in plan
+            if row.detail.startswith("SCAN") and "INDEX" not in row.detail
+        ]
+    with connection.begin():
+        # Small tables are cheaper to scan, so ask whether an index *could*
+        # be used rather than whether the planner chose one
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = connection.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    scans, nodes = [], [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def check_plans(connection):
+    """Map each hot query's name to the tables it scans in full, or return
+    ``None`` if the plans of the connection's database can't be read."""
+    if connection.dialect.name not in DIALECTS:
+        return None
+    return {
+        name: full_scans(connection, statement)
+        for name, statement in hot_queries().items()
+    }
@@ -0,0 +1,157 @@
+import base64
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import joinedload
+
+from app import db
+from .models import Category, Product
+
+PRODUCTS_PER_PAGE = 12
+COUNT_MODES = ("none", "exact", "approx")
+
+
+def products_with_category():
+    # Many-to-one: join the category into the same statement
+    return Product.query.options(joinedload(Product.category))
+
+
+def product_rows():
+    """Select plain ``(id, name, price, category)`` rows for read endpoints
+    that don't need ORM objects."""
+    return db.session.query(
+        Product.id, Product.name, Product.price, Category.name.label("category")
+    ).outerjoin(Category, Product.category_id == Category.id)
+
+
+def category_products(category):
+    # No join needed: product.category resolves from the identity map since
+    # the category itself is already loaded
+    return Product.query.filter(Product.category_id == category.id)
+
+
+def encode_cursor(direction, id):
+    raw = f"{direction}:{id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor):
+    """Return ``(direction, id)`` for a cursor, raising ``ValueError`` if it
+    is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, id = raw.decode().split(":")
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+    if direction not in ("next", "prev"):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return direction, int(id)
+
+
+class KeysetPage:
+    def __init__(self, items, has_next, has_prev, total=None):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor("next", self.items[-1].id)
+
+    @property
+    def prev_cursor(self):
+        if self.has_prev and self.items:
+            return encode_cursor("prev", self.items[0].id)
+
+
+def keyset_window(query, cursor, per_page=PRODUCTS_PER_PAGE, key=Product.id):
+    """Restrict ``query`` to the rows of the page ``cursor`` points at.
+
+    Returns the direction and key from the cursor along with the windowed
+    query, which fetches one extra row to tell whether another page follows.
+    """
+    if per_page < 1:
+        raise ValueError(f"Invalid page size {per_page}")
+    direction, id = decode_cursor(cursor) if cursor else ("next", None)
+    if direction == "next":
+        if id is not None:
+            query = query.filter(key > id)
+        return direction, id, query.order_by(key).limit(per_page + 1)
+    query = query.filter(key < id).order_by(key.desc())
+    return direction, id, query.limit(per_page + 1)
+
+
+def offset_window(query, page, per_page=PRODUCTS_PER_PAGE):
+    if page < 1:
+        raise ValueError(f"Invalid page {page}")
+    if per_page < 1:
+        raise ValueError(f"Invalid page size {per_page}")
+    query = query.order_by(Product.id).limit(per_page + 1)
+    return query.offset((page - 1) * per_page)
+
+
+def keyset_paginate(query, cursor=None, per_page=PRODUCTS_PER_PAGE, count="none"):
+    """Page through ``query`` ordered by ``Product.id`` without OFFSET.
+
+    Each page costs one indexed range scan of ``per_page + 1`` rows however
+    deep it is. ``count`` selects whether to also report an exact or an
+    estimated total.
+    """
+    total = count_products(query, count)
+    return keyset_page(query, cursor, per_page, total=total)
+
+
+def keyset_page(query, cursor, per_page, key=Product.id, total=None):
+    direction, id, window = keyset_window(query, cursor, per_page, key)
+    rows = window.all()
+    if direction == "next":
+        items = rows[:per_page]
+        return KeysetPage(items, len(rows) > per_page, id is not None, total)
+    items = rows[:per_page][::-1]
+    return KeysetPage(items, True, len(rows) > per_page, total)
+
+
+def offset_page(query, page, per_page=PRODUCTS_PER_PAGE, count="none"):
+    """Like :func:`keyset_paginate` but for a page number, kept for old links.
+
+    Unlike ``Query.paginate`` this does not run a ``COUNT(*)`` unless asked.
+    """
+    rows = offset_window(query, page, per_page).all()
+    total = count_products(query, count)
+    return KeysetPage(rows[:per_page], len(rows) > per_page, page > 1, total)
+
+
+def product_versions():
+    """Select only what changes when a listed product does, for validators."""
+    return db.session.query(
+        Product.id, Product.updated_at, Category.updated_at
+    ).outerjoin(Category, Product.category_id == Category.id)
+
+
+def count_products(query, mode):
+    # The estimate is for the whole product table, so only ask for it on
+    # unfiltered listings
+    if mode == "exact":
+        return query.order_by(None).count()
+    if mode == "approx":
+        return estimate_count(Product)
+    return None
+
+
+def estimate_count(model):
+    table = model.__tablename__
+    if db.engine.dialect.name == "postgresql":
+        return db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {"table": table},
+        ).scalar()
+    # The highest primary key is a single index lookup and an upper bound on
+    # the number of rows
+    return db.session.query(func.max(model.id)).scalar() or 0
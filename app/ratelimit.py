@@ -0,0 +1,247 @@
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial, wraps
+
+from blinker import Namespace
+from flask import Response, current_app, request
+
+signals = Namespace()
+# Sent with the reason ("read", "write", "busy" or "auth") whenever a request
+# is shed
+request_shed = signals.signal("request-shed")
+
+
+class LocalLimiterBackend:
+    """Token buckets and concurrency slots held in this process.
+
+    Each gunicorn worker keeps its own buckets, so a client gets the budget
+    once per worker; use the Redis backend to share them. The same goes for
+    the slots: a sync worker only handles one request at a time, so the
+    concurrent write cap only takes effect with threaded workers or Redis.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """Take ``cost`` tokens from ``key``'s bucket. Returns 0 if there was
+        one, else the seconds until there will be. A cost of 0 only looks."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            # Buckets that haven't been used for longest are the ones most
+            # likely to be full again
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def acquire(self, key, limit, ttl):
+        """Take one of ``limit`` slots. Returns a token for :meth:`release`,
+        or ``None`` if they're all taken."""
+        with self._lock:
+            if self._slots.get(key, 0) >= limit:
+                return None
+            self._slots[key] = self._slots.get(key, 0) + 1
+            return True
+
+    def release(self, key, token):
+        with self._lock:
+            self._slots[key] -= 1
+
+
+TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] + clock[2] / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - cost
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+# Slots are members of a sorted set scored by when they expire, so a slot
+# held by a worker that died mid-request lapses on its own
+ACQUIRE_SCRIPT = """
+local limit, ttl = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] + clock[2] / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl))
+return 1
+"""
+
+
+class RedisLimiterBackend:
+    """Shared backend for a redis-py client, so every worker draws from the
+    same buckets. Buckets are refilled in a Lua script against the Redis
+    clock, which keeps them atomic and independent of the workers' clocks."""
+
+    def __init__(self, client, prefix="vanilla:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def take(self, key, rate, burst, cost=1):
+        return float(
+            self.client.eval(TAKE_SCRIPT, 1, self.prefix + key, rate, burst, cost)
+        )
+
+    def acquire(self, key, limit, ttl):
+        token = uuid.uuid4().hex
+        if self.client.eval(ACQUIRE_SCRIPT, 1, self.prefix + key, limit, ttl, token):
+            return token
+        return None
+
+    def release(self, key, token):
+        self.client.zrem(self.prefix + key, token)
+
+
+class _Settings:
+    """One app's limiter configuration and backend."""
+
+    def __init__(self, config):
+        backend = config.get("RATELIMIT_BACKEND", "local")
+        if backend == "local":
+            backend = LocalLimiterBackend()
+        elif backend == "redis":
+            backend = RedisLimiterBackend.from_url(config["RATELIMIT_REDIS_URL"])
+        self.backend = backend
+        self.enabled = config.get("RATELIMIT_ENABLED", True)
+        self.budgets = {
+            "read": (
+                config.get("RATELIMIT_READ_RATE", 20),
+                config.get("RATELIMIT_READ_BURST", 40),
+            ),
+            "write": (
+                config.get("RATELIMIT_WRITE_RATE", 5),
+                config.get("RATELIMIT_WRITE_BURST", 10),
+            ),
+            "auth": (
+                config.get("RATELIMIT_AUTH_FAILURE_RATE", 0.5),
+                config.get("RATELIMIT_AUTH_FAILURE_BURST", 10),
+            ),
+        }
+        self.max_writes = config.get("RATELIMIT_MAX_WRITES", 4)
+        self.write_timeout = config.get("RATELIMIT_WRITE_TIMEOUT", 60)
+
+
+class RateLimiter:
+    """Sheds API requests before they reach the database.
+
+    Each client, the authenticated user or else the remote address, has a
+    token bucket for reads and another for writes. A request that finds its
+    bucket empty gets a 429 with ``Retry-After``. Writes also need one of
+    ``RATELIMIT_MAX_WRITES`` slots, so that a burst can't queue every worker
+    behind the database's write lock; without a free slot the response is a
+    503. The slots are only shared between workers by the Redis backend.
+    Failed authentications are counted per remote address, and once those
+    run out requests from it get a 429 before their credentials are
+    checked. ``RATELIMIT_BACKEND`` is ``local``, ``redis`` or a backend
+    object. Each app has its own settings and backend.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["rate_limiter"] = _Settings(app.config)
+
+    def limit(self, identity):
+        """Decorate an API view; ``identity`` returns the authenticated
+        username, or ``None`` to fall back to the remote address."""
+
+        def decorator(view):
+            @wraps(view)
+            def limited(*args, **kwargs):
+                settings = current_app.extensions["rate_limiter"]
+                if not settings.enabled:
+                    return view(*args, **kwargs)
+                write = request.method not in ("GET", "HEAD", "OPTIONS")
+                budget = "write" if write else "read"
+                user = identity()
+                client = f"user:{user}" if user else f"ip:{request.remote_addr}"
+                rate, burst = settings.budgets[budget]
+                wait = settings.backend.take(f"{budget}:{client}", rate, burst)
+                if wait:
+                    return self.shed(budget, 429, "Rate limit exceeded", wait)
+                if not write or not settings.max_writes:
+                    return view(*args, **kwargs)
+                token = settings.backend.acquire(
+                    "writes", settings.max_writes, settings.write_timeout
+                )
+                if token is None:
+                    return self.shed("busy", 503, "Too many concurrent writes", 1)
+                release = partial(settings.backend.release, "writes", token)
+                try:
+                    response = view(*args, **kwargs)
+                except BaseException:
+                    release()
+                    raise
+                # A streamed body does its work after the view returns
+                if isinstance(response, Response) and response.is_streamed:
+                    response.call_on_close(release)
+                else:
+                    release()
+                return response
+
+            return limited
+
+        return decorator
+
+    def limit_auth_failures(self, view):
+        """Decorate a view outside its authentication check, so an address
+        sending bad credentials is turned away before they're verified."""
+
+        @wraps(view)
+        def limited(*args, **kwargs):
+            settings = current_app.extensions["rate_limiter"]
+            if not settings.enabled:
+                return view(*args, **kwargs)
+            key = f"auth:ip:{request.remote_addr}"
+            rate, burst = settings.budgets["auth"]
+            wait = settings.backend.take(key, rate, burst, cost=0)
+            if wait:
+                return self.shed("auth", 429, "Too many failed authentications", wait)
+            response = view(*args, **kwargs)
+            if getattr(response, "status_code", None) == 401:
+                settings.backend.take(key, rate, burst)
+            return response
+
+        return limited
+
+    def shed(self, reason, status, message, wait):
+        request_shed.send(self, reason=reason)
+        return {"message": message}, status, {"Retry-After": str(math.ceil(wait))}
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+from .cache import NullBackend
+from .models import Category
+
+
+class _Snapshot:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.names = None
+        self.version = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+
+class CategoryRegistry:
+    """Per-process map of every category id to its name.
+
+    Forms render and validate category choices from it instead of loading
+    the category table on each request. The map is reloaded when the
+    fragment cache's ``categories`` tag changes, which every category write
+    (ORM, batch API or import) bumps after committing. A per-process cache
+    backend can't see other workers' writes, so the map is also reloaded
+    after ``CACHE_DEFAULT_TIMEOUT`` seconds. Each app keeps its own map.
+    """
+
+    def __init__(self, cache, app=None):
+        self.cache = cache
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["category_registry"] = _Snapshot(
+            app.config.get("CACHE_DEFAULT_TIMEOUT", 300)
+        )
+
+    def names(self):
+        """Return ``{id: name}`` for every category, in id order."""
+        snapshot = current_app.extensions["category_registry"]
+        version = self.cache.version("categories")
+        if not self._is_fresh(snapshot, version):
+            with snapshot.lock:
+                if not self._is_fresh(snapshot, version):
+                    query = db.session.query(Category.id, Category.name)
+                    snapshot.names = dict(query.order_by(Category.id))
+                    snapshot.version = version
+                    snapshot.loaded_at = time.monotonic()
+        return snapshot.names
+
+    def exists(self, id):
+        """Whether a category with ``id`` exists.
+
+        The map may predate a category another worker just created, so an
+        unknown id is looked up before it is turned down.
+        """
+        return id in self.names() or Category.query.get(id) is not None
+
+    def _is_fresh(self, snapshot, version):
+        if isinstance(self.cache.backend, NullBackend):
+            # Caching is switched off and nothing would signal a change
+            return False
+        return (
+            snapshot.names is not None
+            and version == snapshot.version
+            and time.monotonic() - snapshot.loaded_at < snapshot.ttl
+        )
@@ -0,0 +1,244 @@
+import math
+import re
+
+from sqlalchemy import event, inspect, text
+
+from app import db
+from . import queries
+from .models import Category, Product
+
+
+class SearchPage:
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1
+
+    @property
+    def next_num(self):
+        return self.page + 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class LikeBackend:
+    """Fallback backend that scans the model table with ``LIKE``."""
+
+    def create(self, connection, table):
+        pass
+
+    def index(self, connection, table, id, name):
+        pass
+
+    def remove(self, connection, table, id):
+        pass
+
+    def index_many(self, connection, table, rows):
+        pass
+
+    def remove_many(self, connection, table, ids):
+        pass
+
+    def rebuild(self, connection, table, after_id=None):
+        return 0
+
+    def search(self, model, query, page, per_page):
+        q = listing_query(model).filter(model.name.contains(query))
+        total = q.count()
+        items = q.order_by(model.name).limit(per_page).offset((page - 1) * per_page)
+        return items.all(), total
+
+
+class Fts5Backend:
+    """SQLite FTS5 backend, one ``<table>_fts`` virtual table per model."""
+
+    def create(self, connection, table):
+        connection.execute(
+            text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(name)")
+        )
+
+    def index(self, connection, table, id, name):
+        self.remove(connection, table, id)
+        connection.execute(
+            text(f"INSERT INTO {table}_fts (rowid, name) VALUES (:id, :name)"),
+            {"id": id, "name": name or ""},
+        )
+
+    def remove(self, connection, table, id):
+        connection.execute(
+            text(f"DELETE FROM {table}_fts WHERE rowid = :id"), {"id": id}
+        )
+
+    def index_many(self, connection, table, rows):
+        # Later rows win if an id repeats within the batch
+        rows = [{"id": id, "name": name or ""} for id, name in dict(rows).items()]
+        if not rows:
+            return
+        self.remove_many(connection, table, [row["id"] for row in rows])
+        connection.execute(
+            text(f"INSERT INTO {table}_fts (rowid, name) VALUES (:id, :name)"), rows
+        )
+
+    def remove_many(self, connection, table, ids):
+        if ids:
+            connection.execute(
+                text(f"DELETE FROM {table}_fts WHERE rowid = :id"),
+                [{"id": id} for id in ids],
+            )
+
+    def rebuild(self, connection, table, after_id=None):
+        # With after_id only rows appended since then are (re)indexed
+        params = {"after_id": after_id or 0}
+        connection.execute(
+            text(f"DELETE FROM {table}_fts WHERE rowid > :after_id"), params
+        )
+        result = connection.execute(
+            text(
+                f"INSERT INTO {table}_fts (rowid, name) "
+                f"SELECT id, coalesce(name, '') FROM {table} WHERE id > :after_id"
+            ),
+            params,
+        )
+        return result.rowcount
+
+    def search(self, model, query, page, per_page):
+        table = model.__tablename__
+        match = match_expression(query)
+        if not match:
+            return [], 0
+        total = db.session.execute(
+            text(f"SELECT count(*) FROM {table}_fts WHERE {table}_fts MATCH :q"),
+            {"q": match},
+        ).scalar()
+        ids = (
+            db.session.execute(
+                text(
+                    f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :q "
+                    "ORDER BY rank LIMIT :limit OFFSET :offset"
+                ),
+                {"q": match, "limit": per_page, "offset": (page - 1) * per_page},
+            )
+            .scalars()
+            .all()
+        )
+        if not ids:
+            return [], total
+        objs = listing_query(model).filter(model.id.in_(ids))
+        by_id = {obj.id: obj for obj in objs}
+        return [by_id[id] for id in ids if id in by_id], total
+
+
+backends = {"sqlite": Fts5Backend()}
+default_backend = LikeBackend()
+indexed_models = [Product, Category]
+
+
+def listing_query(model):
+    if model is Product:
+        return queries.products_with_category()
+    return model.query
+
+
+def register_backend(dialect, backend):
+    backends[dialect] = backend
+
+
+def get_backend(dialect):
+    return backends.get(dialect.name, default_backend)
+
+
+def match_expression(query):
+    # Quote every term so user input can't inject FTS5 operators, and match
+    # on prefixes to stay close to the old substring search.
+    terms = re.findall(r"\w+", query or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search(model, query, page=1, per_page=12):
+    backend = get_backend(db.engine.dialect)
+    items, total = backend.search(model, query, page, per_page)
+    return SearchPage(items, page, per_page, total)
+
+
+def is_index_table(name):
+    """Whether ``name`` is an index table, or one of the shadow tables FTS5
+    keeps for it, rather than a table of the models."""
+    return any(
+        name == f"{model.__tablename__}_fts"
+        or name.startswith(f"{model.__tablename__}_fts_")
+        for model in indexed_models
+    )
+
+
+def create_index_tables(connection):
+    backend = get_backend(connection.dialect)
+    for model in indexed_models:
+        backend.create(connection, model.__tablename__)
+
+
+def rebuild(connection, after_ids=None):
+    """Rebuild the index for every indexed model.
+
+    ``after_ids`` maps models to the highest id that is already indexed, to
+    index only rows appended after a bulk load.
+    """
+    backend = get_backend(connection.dialect)
+    counts = {}
+    for model in indexed_models:
+        table = model.__tablename__
+        after_id = (after_ids or {}).get(model)
+        backend.create(connection, table)
+        counts[table] = backend.rebuild(connection, table, after_id)
+    return counts
+
+
+def index_rows(connection, model, rows):
+    """Index ``(id, name)`` rows written without the ORM unit of work."""
+    backend = get_backend(connection.dialect)
+    backend.index_many(connection, model.__tablename__, rows)
+
+
+def remove_rows(connection, model, ids):
+    backend = get_backend(connection.dialect)
+    backend.remove_many(connection, model.__tablename__, ids)
+
+
+def _index(mapper, connection, target):
+    get_backend(connection.dialect).index(
+        connection, mapper.local_table.name, target.id, target.name
+    )
+
+
+def _reindex(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        _index(mapper, connection, target)
+
+
+def _remove(mapper, connection, target):
+    get_backend(connection.dialect).remove(
+        connection, mapper.local_table.name, target.id
+    )
+
+
+for model in indexed_models:
+    event.listen(model, "after_insert", _index)
+    event.listen(model, "after_update", _reindex)
+    event.listen(model, "after_delete", _remove)
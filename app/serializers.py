@@ -0,0 +1,35 @@
+import json
+
+from flask import make_response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def dumps(data):
+    """Encode ``data`` as JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def output_json(data, code, headers=None):
+    """flask_restful representation that encodes the response exactly once."""
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
+
+
+def product_row(row):
+    """Serialize a ``(id, name, price, category)`` row or a Product."""
+    category = row.category
+    if category is not None and not isinstance(category, str):
+        category = category.name
+    return {"name": row.name, "price": row.price, "category": category}
+
+
+def products(rows):
+    return {str(row.id): product_row(row) for row in rows}
@@ -1,17 +1,31 @@
-import os
+import time
 
 from flask import (
     Blueprint,
+    abort,
     current_app,
     flash,
+    make_response,
     redirect,
     render_template,
     request,
+    session,
     url_for,
 )
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 
-from app import ALLOWED_EXTENSIONS, db
+from app import ALLOWED_EXTENSIONS, cache, db
+from . import images, queries, search as search_index
+from .conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+    set_validators,
+)
+from .database import read_only
 from .models import Category, Product
 from .forms import CategoryForm, ProductForm, SearchForm
 
@@ -42,43 +56,145 @@ def search_form():
     return {"search_form": _search_form}
 
 
+def render_cached(key, tags, template, load):
+    """Render ``template`` inside the site layout, caching the fragment.
+
+    ``load`` returns the template context and is only called on a cache miss.
+    The layout itself is rendered on every request since it carries the
+    user's CSRF token and flashed messages.
+    """
+    content = cache.cached(key, tags, lambda: render_template(template, **load()))
+    return render_template("page.html", content=Markup(content))
+
+
+def page_etag(*parts):
+    """Validator for a full HTML page built from ``parts``.
+
+    The layout depends on the logged-in user and their CSRF token, which is
+    only valid for ``WTF_CSRF_TIME_LIMIT``, so those go into the ETag too.
+    Pages with pending flash messages get no validator at all.
+    """
+    if session.get("_flashes"):
+        return None
+    time_limit = current_app.config.get("WTF_CSRF_TIME_LIMIT") or 3600
+    return make_etag(
+        *parts,
+        current_user.get_id(),
+        session.get("csrf_token"),
+        int(time.time() // (time_limit / 2)),
+    )
+
+
 @bp.route("/")
 def index():
-    return render_template("index.html")
+    return render_cached("index", [], "fragments/index.html", dict)
 
 
-@bp.route("/search", methods=["POST"])
+@bp.route("/search", methods=["GET", "POST"])
+@read_only
 def search():
-    query = request.form.get("query")
-    products = Product.query.filter(Product.name.contains(query))
-    categories = Category.query.filter(Category.name.contains(query))
-    return render_template("search.html", products=products, categories=categories)
+    query = request.values.get("query", "")
+    # Each list pages on its own, so one running out doesn't end the other
+    page = max(request.args.get("page", 1, type=int), 1)
+    category_page = max(request.args.get("category_page", 1, type=int), 1)
+    products = search_index.search(Product, query, page)
+    categories = search_index.search(Category, query, category_page)
+    return render_template(
+        "search.html", query=query, products=products, categories=categories
+    )
 
 
 @bp.route("/products")
 @bp.route("/products/<int:page>")
-def products(page=1):
-    # products = Product.query.all()
-    products = Product.query.paginate(page, 12)
-    return render_template("products.html", products=products)
+@read_only
+def products(page=None):
+    cursor = request.args.get("cursor")
+
+    def load():
+        query = queries.products_with_category()
+        try:
+            if page is None:
+                products = queries.keyset_paginate(query, cursor)
+            else:
+                products = queries.offset_page(query, page)
+        except ValueError:
+            abort(400)
+        return {"products": products}
+
+    return render_cached(
+        f"products:{page}:{cursor}",
+        ["products", "categories"],
+        "fragments/products.html",
+        load,
+    )
 
 
 @bp.route("/categories")
+@read_only
 def categories():
-    categories = Category.query.all()
-    return render_template("categories.html", categories=categories)
+    def load():
+        return {"categories": Category.query.all()}
+
+    return render_cached(
+        "categories",
+        ["categories", "category-stats"],
+        "fragments/categories.html",
+        load,
+    )
 
 
-@bp.route("/product/<id>")
+@bp.route("/product/<int:id>")
+@read_only
 def product(id):
-    product = Product.query.get_or_404(id)
-    return render_template("product.html", product=product)
-
-
-@bp.route("/category/<id>")
+    # No Last-Modified here: a date can't capture the per-user layout
+    versions = queries.product_versions().filter(Product.id == id).first_or_404()
+    etag = page_etag(versions)
+    if etag and is_not_modified(etag):
+        return not_modified_response(etag)
+
+    def load():
+        query = queries.products_with_category().filter_by(id=id)
+        return {"product": query.first_or_404()}
+
+    response = make_response(
+        render_cached(
+            f"product:{id}",
+            [f"product:{id}", "categories"],
+            "fragments/product.html",
+            load,
+        )
+    )
+    # Rendering may have started the session's CSRF token, so compute the
+    # validator again for the copy the browser keeps
+    etag = page_etag(versions)
+    if etag:
+        set_validators(response, etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Cookie")
+    return response
+
+
+@bp.route("/category/<int:id>")
+@read_only
 def category(id):
-    category = Category.query.get_or_404(id)
-    return render_template("category.html", category=category)
+    cursor = request.args.get("cursor")
+
+    def load():
+        category = Category.query.get_or_404(id)
+        try:
+            products = queries.keyset_paginate(
+                queries.category_products(category), cursor
+            )
+        except ValueError:
+            abort(400)
+        return {"category": category, "products": products}
+
+    return render_cached(
+        f"category:{id}:{cursor}",
+        [f"category:{id}"],
+        "fragments/category.html",
+        load,
+    )
 
 
 @bp.route("/create-product", methods=["GET", "POST"])
@@ -88,22 +204,27 @@ def create_product():
     if form.validate_on_submit():
         name = form.name.data
         price = form.price.data
-        category = Category.query.get_or_404(form.category.data)
+        # The form checked the id against the category registry
+        category_id = form.category.data
         image = form.image.data
 
         if image:
             if allowed_file(image.filename):
-                filename = secure_filename(image.filename)
-                image.save(os.path.join(current_app.config["UPLOAD_FOLDER"], filename))
+                extension = secure_filename(image.filename).rsplit(".", 1)[1].lower()
+                filename = images.save_upload(
+                    image, current_app.config["UPLOAD_FOLDER"], extension
+                )
             else:
                 flash("Invalid image", "negative")
                 return render_template("create-product.html", form=form), 400
         else:
             filename = None
 
-        product = Product(name, price, category, filename)
+        product = Product(name, price, category_id, filename)
         db.session.add(product)
         db.session.commit()
+        if filename:
+            images.schedule(current_app._get_current_object(), filename)
 
         flash(f"Product {name} created!", "positive")
         return redirect(url_for("main.product", id=product.id))
@@ -128,7 +249,13 @@ def create_category():
         name = form.name.data
         category = Category(name)
         db.session.add(category)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request created the same name after the form's check
+            db.session.rollback()
+            flash({"name": [f"Category named {name} already exists"]}, "negative")
+            return render_template("create-category.html", form=form), 400
         flash(f"Category {name} created!", "positive")
         return redirect(url_for("main.category", id=category.id))
 
@@ -0,0 +1,299 @@
+"""Throughput and latency of the catalog pages and the product API.
+
+Seeds a synthetic catalog into a temporary SQLite database, then replays a
+fixed mix of requests through the Flask test client and, with --gunicorn,
+against a local gunicorn server. Results are written as JSON so runs on
+different commits can be compared.
+
+    $ python -m benchmarks.catalog --products 100000 --output bench.json
+    $ python -m benchmarks.catalog --products 10000 --gunicorn --workers 4
+
+The API rate limiter is off unless --rate-limit is given; requests it sheds
+are then counted per scenario instead of failing the run.
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERNAME = "bench"
+PASSWORD = "bench"
+ADJECTIVES = ["red", "small", "organic", "vintage", "smart", "heavy", "fresh"]
+NOUNS = ["chair", "lamp", "coffee", "shirt", "phone", "table", "book", "tea"]
+
+
+def synthetic_products(count, categories, rng):
+    for i in range(count):
+        yield {
+            "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+            "price": round(rng.uniform(1, 500), 2),
+            "category": f"Category {rng.randrange(categories)}",
+        }
+
+
+def seed(app, products, categories, rng):
+    from app import db
+    from app.auth.models import User
+    from app.importer import Importer
+
+    started = time.perf_counter()
+    with app.app_context():
+        db.session.add(User(USERNAME, PASSWORD))
+        db.session.commit()
+        Importer().run(synthetic_products(products, categories, rng))
+    return time.perf_counter() - started
+
+
+def scenarios(products, categories):
+    """Map scenario names to functions returning ``(method, path, json)``."""
+    pages = max(products // 12, 1)
+    return {
+        "api_get_product": lambda rng: (
+            "GET",
+            f"/api/v1/product/{rng.randint(1, products)}",
+            None,
+        ),
+        "api_list_products": lambda rng: ("GET", "/api/v1/product?limit=20", None),
+        "api_create_product": lambda rng: (
+            "POST",
+            "/api/v1/product",
+            {
+                "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+                "price": 9.99,
+                "category": {"name": f"Category {rng.randrange(categories)}"},
+            },
+        ),
+        "products_page": lambda rng: (
+            "GET",
+            f"/products/{rng.randint(1, pages)}",
+            None,
+        ),
+        "search": lambda rng: ("GET", f"/search?query={rng.choice(NOUNS)}", None),
+        "category": lambda rng: (
+            "GET",
+            f"/category/{rng.randint(1, categories)}",
+            None,
+        ),
+    }
+
+
+SHED = (429, 503)
+
+
+def summarize(latencies, elapsed, shed=0):
+    latencies = sorted(latencies)
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(0.50), 2),
+        "p99_ms": round(percentile(0.99), 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "shed": shed,
+    }
+
+
+def token_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def run_test_client(app, mix, requests, rng):
+    client = app.test_client()
+    basic = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    token = client.post(
+        "/api/v1/token", headers={"Authorization": f"Basic {basic}"}
+    ).json["token"]
+    results = {}
+    for name, make_request in mix.items():
+        latencies = []
+        shed = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            method, path, body = make_request(rng)
+            request_started = time.perf_counter()
+            response = client.open(
+                path, method=method, json=body, headers=token_headers(token)
+            )
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code in SHED:
+                shed += 1
+            elif response.status_code >= 400:
+                raise RuntimeError(f"{method} {path}: {response.status_code}")
+        results[name] = summarize(latencies, time.perf_counter() - started, shed)
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=5)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start within {timeout}s")
+
+
+def run_gunicorn(env, mix, requests, workers, concurrency, seed_value):
+    import requests as http
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "app:create_app()",
+            "-b",
+            f"127.0.0.1:{port}",
+            "-w",
+            str(workers),
+            "--threads",
+            "1",
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        wait_for(base + "/")
+        token = http.post(base + "/api/v1/token", auth=(USERNAME, PASSWORD)).json()[
+            "token"
+        ]
+        local = threading.local()
+        results = {}
+        for name, make_request in mix.items():
+            rngs = [random.Random(seed_value + i) for i in range(requests)]
+
+            def send(rng):
+                if not hasattr(local, "session"):
+                    local.session = http.Session()
+                    local.session.headers.update(token_headers(token))
+                method, path, body = make_request(rng)
+                request_started = time.perf_counter()
+                response = local.session.request(method, base + path, json=body)
+                elapsed = time.perf_counter() - request_started
+                if response.status_code in SHED:
+                    return elapsed, True
+                response.raise_for_status()
+                return elapsed, False
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                sent = list(executor.map(send, rngs))
+            results[name] = summarize(
+                [elapsed for elapsed, _ in sent],
+                time.perf_counter() - started,
+                sum(shed for _, shed in sent),
+            )
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", choices=["lru", "null"], default="lru")
+    parser.add_argument("--rate-limit", action="store_true")
+    parser.add_argument("--gunicorn", action="store_true")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", type=argparse.FileType("w"), default="-")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="vanilla-bench-") as tmp:
+        # create_app reads these, and gunicorn workers inherit them
+        env = dict(
+            os.environ,
+            DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench.db"),
+            SECRET_KEY=os.environ.get("SECRET_KEY") or "benchmark",
+            CACHE_TYPE=args.cache,
+            METRICS_ENABLED="0",
+            IMAGE_WORKERS="0",
+            RATELIMIT_ENABLED="1" if args.rate_limit else "0",
+        )
+        env.pop("SENTRY_DSN", None)
+        os.environ.update(env)
+        os.environ.pop("SENTRY_DSN", None)
+
+        from app import create_app
+
+        app = create_app()
+        rng = random.Random(args.seed)
+        seed_seconds = seed(app, args.products, args.categories, rng)
+        mix = scenarios(args.products, args.categories)
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "config": {
+                "products": args.products,
+                "categories": args.categories,
+                "requests": args.requests,
+                "seed": args.seed,
+                "cache": args.cache,
+                "rate_limit": args.rate_limit,
+            },
+            "seed_seconds": round(seed_seconds, 2),
+            "test_client": run_test_client(app, mix, args.requests, rng),
+        }
+        if args.gunicorn:
+            report["gunicorn"] = run_gunicorn(
+                env,
+                mix,
+                args.requests,
+                args.workers,
+                args.concurrency,
+                args.seed,
+            )
+            report["config"].update(workers=args.workers, concurrency=args.concurrency)
+
+    json.dump(report, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Bytes on the wire against CPU time for each compression level.
+
+Seeds a synthetic catalog, fetches a few typical uncompressed responses
+(catalog pages, API JSON and the streamed NDJSON export) and compresses each
+one at every level of every available encoding. Brotli and zstd are included
+when their packages are installed. Results are written as JSON:
+
+    $ python -m benchmarks.compression --products 5000 --output compression.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.catalog import PASSWORD, USERNAME, git_commit, seed
+
+LEVELS = {
+    "gzip": range(1, 10),
+    "br": range(0, 12),
+    "zstd": [1, 3, 6, 9, 12, 15, 19],
+}
+
+
+def samples(app, products, categories):
+    client = app.test_client()
+    basic = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    headers = {"Authorization": f"Basic {basic}", "Accept-Encoding": "identity"}
+    paths = {
+        "products_page": "/products",
+        "category_page": f"/category/{max(categories // 2, 1)}",
+        "api_list_products": "/api/v1/product?limit=100",
+        "api_export_ndjson": "/api/v1/products:export",
+    }
+    bodies = {}
+    for name, path in paths.items():
+        response = client.get(path, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path}: {response.status_code}")
+        if response.is_streamed:
+            # Streamed responses are compressed chunk by chunk
+            chunks = list(response.response)
+            bodies[name] = (b"".join(chunks), chunks)
+        else:
+            bodies[name] = (response.get_data(), None)
+    return bodies
+
+
+def measure(encoder_class, level, body, chunks, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        encoder = encoder_class(level)
+        if chunks is None:
+            size = len(encoder.compress(body) + encoder.finish())
+        else:
+            size = sum(len(encoder.compress(c) + encoder.flush()) for c in chunks)
+            size += len(encoder.finish())
+    cpu = (time.process_time() - started) / repeat
+    return {
+        "level": level,
+        "bytes": size,
+        "ratio": round(len(body) / size, 2),
+        "cpu_ms": round(cpu * 1000, 3),
+        "mb_per_cpu_second": round(len(body) / cpu / 1e6, 1) if cpu else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=argparse.FileType("w"), default="-")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="vanilla-bench-") as tmp:
+        os.environ.update(
+            DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench.db"),
+            SECRET_KEY=os.environ.get("SECRET_KEY") or "benchmark",
+            METRICS_ENABLED="0",
+            IMAGE_WORKERS="0",
+            RATELIMIT_ENABLED="0",
+        )
+        os.environ.pop("SENTRY_DSN", None)
+
+        from app import create_app
+        from app.compression import available_encoders
+
+        app = create_app()
+        seed(app, args.products, args.categories, random.Random(args.seed))
+        bodies = samples(app, args.products, args.categories)
+
+    results = {}
+    for name, (body, chunks) in bodies.items():
+        results[name] = {
+            "identity_bytes": len(body),
+            "chunks": len(chunks) if chunks is not None else None,
+        }
+        for encoding, encoder_class in available_encoders().items():
+            results[name][encoding] = [
+                measure(encoder_class, level, body, chunks, args.repeat)
+                for level in LEVELS[encoding]
+            ]
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "products": args.products,
+            "categories": args.categories,
+            "repeat": args.repeat,
+        },
+        "responses": results,
+    }
+    json.dump(report, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Per-row cost of serializing ProductApi responses.
+
+Compares the old path (ORM objects, json.dumps to a string that
+flask_restful then encoded a second time) with the current one (plain rows
+encoded once through app.serializers).
+
+    $ python -m benchmarks.serialization --rows 20000
+"""
+
+import argparse
+import json
+import timeit
+from collections import namedtuple
+
+from app import serializers
+from app.models import Category, Product
+
+Row = namedtuple("Row", "id name price category")
+
+
+def old_path(products):
+    res = {}
+    for product in products:
+        res[product.id] = {
+            "name": product.name,
+            "price": product.price,
+            "category": product.category.name,
+        }
+    # flask_restful encoded the returned string again
+    return json.dumps(json.dumps(res)).encode()
+
+
+def new_path(rows):
+    return serializers.dumps(serializers.products(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    categories = [Category(f"Category {i}") for i in range(50)]
+    products, rows = [], []
+    for i in range(args.rows):
+        category = categories[i % len(categories)]
+        product = Product(f"Product {i}", i * 1.25, category, None)
+        product.id = i + 1
+        products.append(product)
+        rows.append(Row(i + 1, product.name, product.price, category.name))
+
+    results = {}
+    for name, func, data in (
+        ("old", old_path, products),
+        ("new", new_path, rows),
+    ):
+        best = min(timeit.repeat(lambda: func(data), number=1, repeat=args.repeat))
+        results[name] = best / args.rows * 1e6
+    backend = "orjson" if serializers.orjson is not None else "json"
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "encoder": backend,
+                "old_us_per_row": round(results["old"], 3),
+                "new_us_per_row": round(results["new"], 3),
+                "speedup": round(results["old"] / results["new"], 2),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Cold start cost: import time of the app package and of create_app().
+
+Runs a fresh interpreter with ``-X importtime`` and reports the total, the
+slowest imports and the time spent in create_app() as JSON. Extra
+environment variables are passed through, so settings can be compared:
+
+    $ python -m benchmarks.startup
+    $ DATABASE_CREATE_ALL=0 ADMIN_ENABLED=0 python -m benchmarks.startup
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+
+def parse_importtime(stderr):
+    """Yield ``(module, parent, cumulative_us)`` for each import.
+
+    ``-X importtime`` prints a module after everything it imported, one
+    indentation level deeper, so children are collected until their parent
+    shows up.
+    """
+    pending = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        timing, name = line[len("import time:") :].rsplit("|", 1)
+        cumulative_us = int(timing.split("|")[1])
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        for child, child_cumulative in pending.pop(depth + 1, []):
+            yield child, name, child_cumulative
+        pending.setdefault(depth, []).append((name, cumulative_us))
+    for child, child_cumulative in pending.pop(0, []):
+        yield child, None, child_cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", type=argparse.FileType("w"), default="-")
+    args = parser.parse_args()
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_seconds, create_app_seconds = map(float, result.stdout.split()[-2:])
+    imports = list(parse_importtime(result.stderr))
+    # Libraries imported by the app's own modules, and what each one cost
+    direct = [
+        (name, cumulative)
+        for name, parent, cumulative in imports
+        if parent
+        and (parent == "app" or parent.startswith("app."))
+        and not name.startswith("app.")
+    ]
+    direct.sort(key=lambda i: i[1], reverse=True)
+    report = {
+        "import_seconds": round(import_seconds, 3),
+        "create_app_seconds": round(create_app_seconds, 3),
+        "modules_imported": len(imports),
+        "slowest_imports": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+            for name, cumulative in direct[: args.top]
+        ],
+    }
+    json.dump(report, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
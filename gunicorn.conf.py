@@ -0,0 +1,11 @@
+# Picked up automatically by gunicorn when started from the project root
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges from the shared Prometheus metrics
+    import os
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,52 @@
+"""add category product aggregates
+
+Revision ID: 4b7d0e2c9a85
+Revises: e8b14d6c93a2
+Create Date: 2026-10-18 15:12:07.402918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7d0e2c9a85'
+down_revision = 'e8b14d6c93a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('category', sa.Column('product_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('category', sa.Column('price_min', sa.Float(), nullable=True))
+    op.add_column('category', sa.Column('price_max', sa.Float(), nullable=True))
+    op.add_column('category', sa.Column('price_total', sa.Float(), server_default='0', nullable=False))
+    op.create_index('ix_product_category_price', 'product', ['category_id', 'price'], unique=False)
+
+    # Same as `flask catalog reconcile`
+    category = sa.table(
+        'category', sa.column('id'), sa.column('product_count'), sa.column('price_min'),
+        sa.column('price_max'), sa.column('price_total'),
+    )
+    product = sa.table('product', sa.column('id'), sa.column('category_id'), sa.column('price'))
+
+    def aggregate(expression):
+        return sa.select(expression).where(product.c.category_id == category.c.id).scalar_subquery()
+
+    op.execute(
+        category.update().values(
+            product_count=aggregate(sa.func.count(product.c.id)),
+            price_min=aggregate(sa.func.min(product.c.price)),
+            price_max=aggregate(sa.func.max(product.c.price)),
+            price_total=aggregate(sa.func.coalesce(sa.func.sum(product.c.price), 0)),
+        )
+    )
+
+
+def downgrade():
+    op.drop_index('ix_product_category_price', table_name='product')
+    with op.batch_alter_table('category') as batch_op:
+        batch_op.drop_column('price_total')
+        batch_op.drop_column('price_max')
+        batch_op.drop_column('price_min')
+        batch_op.drop_column('product_count')
@@ -0,0 +1,35 @@
+"""full-text search index
+
+Revision ID: 8f2a61c4d0b7
+Revises: 5c91bc6f02d6
+Create Date: 2026-10-18 09:12:44.118302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2a61c4d0b7'
+down_revision = '5c91bc6f02d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 virtual tables only exist on SQLite; other databases use the
+    # LIKE fallback in app.search.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ('product', 'category'):
+        op.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(name)')
+        op.execute(
+            f"INSERT INTO {table}_fts (rowid, name) "
+            f"SELECT id, coalesce(name, '') FROM {table}"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ('product', 'category'):
+        op.execute(f'DROP TABLE IF EXISTS {table}_fts')
@@ -0,0 +1,54 @@
+"""add indexes for hot lookups
+
+Revision ID: c52e8a3f71b9
+Revises: a41c7e09f2d3
+Create Date: 2026-10-18 13:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e8a3f71b9'
+down_revision = 'a41c7e09f2d3'
+branch_labels = None
+depends_on = None
+
+
+def rename_duplicate_usernames(connection):
+    # Users own logins and OAuth links, so unlike categories they can't be
+    # merged: the oldest keeps the name and the others get a numbered one
+    user = sa.table('user', sa.column('id'), sa.column('username'))
+    rows = connection.execute(sa.select(user.c.id, user.c.username).order_by(user.c.id)).all()
+    taken = {username for _, username in rows}
+    seen = set()
+    for id, username in rows:
+        if username is None:
+            continue
+        if username in seen:
+            suffix = 2
+            while f'{username}-{suffix}' in taken:
+                suffix += 1
+            new_name = f'{username}-{suffix}'
+            taken.add(new_name)
+            connection.execute(user.update().where(user.c.id == id).values(username=new_name))
+        seen.add(username)
+
+
+def upgrade():
+    op.create_index('ix_product_name', 'product', ['name'], unique=False)
+    op.create_index('ix_product_category_id', 'product', ['category_id', 'id'], unique=False)
+    op.create_index('ix_category_name', 'category', ['name'], unique=False)
+    op.create_index('ix_category_name_lower', 'category', [sa.text('lower(name)')], unique=False)
+    rename_duplicate_usernames(op.get_bind())
+    op.create_index('ix_user_username', 'user', ['username'], unique=True)
+    # oauth.provider_user_id is already covered by its unique constraint
+
+
+def downgrade():
+    op.drop_index('ix_user_username', table_name='user')
+    op.drop_index('ix_category_name_lower', table_name='category')
+    op.drop_index('ix_category_name', table_name='category')
+    op.drop_index('ix_product_category_id', table_name='product')
+    op.drop_index('ix_product_name', table_name='product')
@@ -0,0 +1,61 @@
+"""add normalized unique category name
+
+Revision ID: e8b14d6c93a2
+Revises: c52e8a3f71b9
+Create Date: 2026-10-18 13:48:12.530416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b14d6c93a2'
+down_revision = 'c52e8a3f71b9'
+branch_labels = None
+depends_on = None
+
+
+def normalize(name):
+    # Must match Category.normalize
+    return " ".join((name or "").split()).casefold()
+
+
+def upgrade():
+    op.add_column('category', sa.Column('name_key', sa.String(length=255), nullable=True))
+
+    connection = op.get_bind()
+    category = sa.table('category', sa.column('id'), sa.column('name'), sa.column('name_key'))
+    product = sa.table('product', sa.column('category_id'))
+    rows = connection.execute(sa.select(category.c.id, category.c.name).order_by(category.c.id))
+    keep = {}
+    for id, name in rows.all():
+        key = normalize(name)
+        if key in keep:
+            # Names that only differ in case or spacing were meant to be the
+            # same category: move the products over to the oldest one
+            connection.execute(
+                product.update().where(product.c.category_id == id).values(category_id=keep[key])
+            )
+            connection.execute(category.delete().where(category.c.id == id))
+            if sa.inspect(connection).has_table('category_fts'):
+                connection.execute(sa.text('DELETE FROM category_fts WHERE rowid = :id'), {'id': id})
+        else:
+            keep[key] = id
+            connection.execute(
+                category.update().where(category.c.id == id).values(name_key=key)
+            )
+
+    # Lookups go through name_key now. Dropped outside the batch because
+    # SQLite batch mode can't reflect expression indexes.
+    op.drop_index('ix_category_name_lower', table_name='category')
+    with op.batch_alter_table('category') as batch_op:
+        batch_op.alter_column('name_key', existing_type=sa.String(length=255), nullable=False)
+        batch_op.create_index('ix_category_name_key', ['name_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('category') as batch_op:
+        batch_op.drop_index('ix_category_name_key')
+        batch_op.drop_column('name_key')
+    op.create_index('ix_category_name_lower', 'category', [sa.text('lower(name)')], unique=False)
@@ -0,0 +1,108 @@
+import base64
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.auth.models import User
+from app.models import Category, Product
+
+USERNAME = "tester"
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make_app(**config):
+        return create_app(
+            {
+                "TESTING": True,
+                "SECRET_KEY": "testing",
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+                "WTF_CSRF_ENABLED": False,
+                "IMAGE_WORKERS": 0,
+                "RATELIMIT_ENABLED": False,
+                "SENTRY_DSN": None,
+                **config,
+            }
+        )
+
+    return make_app
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(USERNAME, PASSWORD))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def api_headers():
+    credentials = base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    return {"Authorization": f"Basic {credentials}"}
+
+
+@pytest.fixture
+def add_products(app):
+    def add_products(count, categories=None):
+        """Add ``count`` products, by default each in a category of its own."""
+        with app.app_context():
+            categories = [Category(f"Category {i}") for i in range(categories or count)]
+            for i in range(count):
+                category = categories[i % len(categories)]
+                db.session.add(Product(f"Product {i}", 10.0 + i, category, None))
+            db.session.commit()
+
+    return add_products
+
+
+@pytest.fixture
+def count_statements(app):
+    @contextmanager
+    def count_statements(target=None):
+        """Collect the SQL statements ``target``, by default the ``app``
+        fixture, runs inside the block."""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with (target or app).app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return count_statements
+
+
+@pytest.fixture
+def login(app, client):
+    def login(username=USERNAME, password=PASSWORD, admin=False):
+        with app.app_context():
+            user = User.query.filter_by(username=username).first()
+            if user is None:
+                user = User(username, password)
+                db.session.add(user)
+            user.admin = admin
+            db.session.commit()
+        response = client.post(
+            "/login", data={"username": username, "password": password}
+        )
+        assert response.status_code == 302
+
+    return login
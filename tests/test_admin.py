@@ -0,0 +1,37 @@
+from app.models import Product
+
+CHANGE_PRICE = {"ids": "1,2", "mode": "set", "amount": "1"}
+
+
+def prices(app):
+    with app.app_context():
+        return sorted(p.price for p in Product.query.all())
+
+
+def test_anonymous_users_are_sent_to_login(app, client, add_products):
+    add_products(2)
+    for path in ("/admin/", "/admin/product/", "/admin/category/"):
+        response = client.get(path)
+        assert response.status_code == 302
+        assert response.location.endswith("/login")
+    response = client.post("/admin/product/change-price/", data=CHANGE_PRICE)
+    assert response.status_code == 302
+    assert prices(app) == [10.0, 11.0]
+
+
+def test_bulk_actions_need_an_admin(app, client, add_products, login):
+    add_products(2)
+    login()
+    assert client.get("/admin/product/").status_code == 403
+    response = client.post("/admin/product/change-price/", data=CHANGE_PRICE)
+    assert response.status_code == 403
+    assert prices(app) == [10.0, 11.0]
+
+
+def test_admins_can_change_prices(app, client, add_products, login):
+    add_products(2)
+    login(admin=True)
+    assert client.get("/admin/product/").status_code == 200
+    response = client.post("/admin/product/change-price/", data=CHANGE_PRICE)
+    assert response.status_code == 302
+    assert prices(app) == [1.0, 1.0]
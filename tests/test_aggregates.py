@@ -0,0 +1,78 @@
+from app import db
+from app.aggregates import reconcile
+from app.models import Category
+
+
+def stored_and_actual(app):
+    """The stored aggregates of every category, then the same recomputed."""
+
+    def snapshot():
+        db.session.expire_all()
+        return {
+            c.name: (c.product_count, c.price_min, c.price_max, c.price_total)
+            for c in Category.query.order_by(Category.id)
+        }
+
+    with app.app_context():
+        stored = snapshot()
+        with db.engine.begin() as connection:
+            reconcile(connection)
+        return stored, snapshot()
+
+
+def test_product_created_through_the_form_updates_its_category(
+    app, client, add_products
+):
+    add_products(1)
+    response = client.post(
+        "/create-product",
+        data={"name": "Kettle", "price": "12.50", "category": "1"},
+    )
+    assert response.status_code == 302
+    stored, actual = stored_and_actual(app)
+    assert stored == actual
+    assert stored["Category 0"] == (2, 10.0, 12.5, 22.5)
+
+
+def test_sibling_changes_keep_product_validators(client, api_headers, add_products):
+    add_products(2, categories=1)
+    api = client.get("/api/v1/product/1", headers=api_headers)
+    page = client.get("/product/1")
+
+    client.post(
+        "/api/v1/product",
+        json={"name": "Kettle", "price": 5, "category": {"name": "Category 0"}},
+        headers=api_headers,
+    )
+    client.delete("/api/v1/product/2", headers=api_headers)
+
+    for validator in (
+        {"If-None-Match": api.headers["ETag"]},
+        {"If-Modified-Since": api.headers["Last-Modified"]},
+    ):
+        response = client.get("/api/v1/product/1", headers={**api_headers, **validator})
+        assert response.status_code == 304
+    response = client.get("/product/1", headers={"If-None-Match": page.headers["ETag"]})
+    assert response.status_code == 304
+
+
+def test_batch_with_repeated_ids_keeps_aggregates_exact(
+    app, client, api_headers, add_products
+):
+    add_products(3, categories=1)
+    items = [
+        {"op": "update", "id": 1, "name": "A", "price": 100, "category": "Category 0"},
+        {"op": "update", "id": 1, "name": "A", "price": 50, "category": "Other"},
+        {"op": "delete", "id": 2},
+        {"op": "update", "id": 2, "name": "B", "price": 7, "category": "Category 0"},
+        {"op": "delete", "id": 3},
+        {"op": "delete", "id": 3},
+        {"op": "create", "name": "C", "price": 3, "category": "Category 0"},
+    ]
+    response = client.post("/api/v1/products:batch", json=items, headers=api_headers)
+    statuses = [r["status"] for r in response.json["results"]]
+    assert statuses == [200, 200, 204, 404, 204, 404, 201]
+    stored, actual = stored_and_actual(app)
+    assert stored == actual
+    assert stored["Category 0"] == (1, 3.0, 3.0, 3.0)
+    assert stored["Other"] == (1, 50.0, 50.0, 50.0)
@@ -0,0 +1,16 @@
+from app.assets import build
+
+
+def test_build_fingerprints_assets_and_leaves_out_sources(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "main.css").write_text("body { color: red }")
+    (tmp_path / "sass").mkdir()
+    (tmp_path / "sass" / "main.scss").write_text("$red: red;")
+
+    manifest = build(str(tmp_path))
+
+    assert list(manifest) == ["css/main.css"]
+    built = tmp_path / manifest["css/main.css"]
+    assert built.read_text() == "body { color: red }"
+    assert (tmp_path / (manifest["css/main.css"] + ".gz")).exists()
+    assert not (tmp_path / "dist" / "sass").exists()
@@ -0,0 +1,34 @@
+import importlib.util
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from app import db
+from app.auth.models import User
+
+MIGRATION = Path(__file__).parent.parent / "migrations/versions/c52e8a3f71b9_.py"
+
+
+def test_free_username_skips_taken_names(app):
+    with app.app_context():
+        db.session.add_all([User("Ada", "x"), User("ada-gh", "x"), User("Ada-2", "x")])
+        db.session.commit()
+        assert User.free_username("Grace", "grace-gh") == "Grace"
+        assert User.free_username(None, "grace-gh") == "grace-gh"
+        assert User.free_username("Ada", "ada-gh") == "Ada-3"
+
+
+def test_index_migration_renames_duplicate_usernames():
+    spec = importlib.util.spec_from_file_location("migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(sa.text("CREATE TABLE user (id INTEGER, username TEXT)"))
+        connection.execute(
+            sa.text("INSERT INTO user VALUES (1, 'ada'), (2, 'ada'), (3, 'ada-2')")
+        )
+        migration.rename_duplicate_usernames(connection)
+        rows = connection.execute(sa.text("SELECT id, username FROM user ORDER BY id"))
+        assert rows.all() == [(1, "ada"), (2, "ada-3"), (3, "ada-2")]
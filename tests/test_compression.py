@@ -0,0 +1,65 @@
+import gzip
+import io
+
+from flask import send_file
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_api_list_is_gzipped(client, api_headers, add_products):
+    add_products(30)
+    plain = client.get("/api/v1/product?limit=30", headers=api_headers)
+    compressed = client.get("/api/v1/product?limit=30", headers={**api_headers, **GZIP})
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.vary
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_streamed_export_is_gzipped(client, api_headers, add_products):
+    add_products(30)
+    url = "/api/v1/products:export?format=csv"
+    plain = client.get(url, headers=api_headers)
+    compressed = client.get(url, headers={**api_headers, **GZIP})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in compressed.headers
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_small_and_binary_bodies_are_left_alone(app, client, api_headers, add_products):
+    add_products(1)
+    small = client.get("/api/v1/product/1", headers={**api_headers, **GZIP})
+    assert small.status_code == 200
+    assert "Content-Encoding" not in small.headers
+
+    @app.route("/image")
+    def image():
+        return app.response_class(b"\x89PNG" + b"\0" * 2000, mimetype="image/png")
+
+    response = client.get("/image", headers=GZIP)
+    assert "Content-Encoding" not in response.headers
+    assert len(response.data) == 2004
+
+
+def test_not_modified_carries_the_validator_of_the_full_response(
+    app, client, api_headers, add_products
+):
+    add_products(30)
+
+    @app.route("/sent.css")
+    def sent():
+        return send_file(io.BytesIO(b"p {}" * 500), mimetype="text/css", etag="css")
+
+    # Compressed, compressible but too small to compress, and a file sent as
+    # it is
+    for url, headers in (
+        ("/api/v1/product?limit=30", {**api_headers, **GZIP}),
+        ("/api/v1/product/1", {**api_headers, **GZIP}),
+        ("/sent.css", GZIP),
+    ):
+        full = client.get(url, headers=headers)
+        assert full.status_code == 200
+        etag = full.headers["ETag"]
+        cached = client.get(url, headers={**headers, "If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == etag
@@ -0,0 +1,28 @@
+def test_deleting_a_listed_product_changes_the_page_validator(
+    client, api_headers, add_products
+):
+    add_products(3)
+    response = client.get("/api/v1/product?limit=2", headers=api_headers)
+    assert set(response.json) == {"1", "2"}
+    assert "Last-Modified" not in response.headers
+    etag = response.headers["ETag"]
+
+    client.delete("/api/v1/product/2", headers=api_headers)
+    response = client.get(
+        "/api/v1/product?limit=2", headers={**api_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert set(response.json) == {"1", "3"}
+
+
+def test_unchanged_product_is_not_modified(client, api_headers, add_products):
+    add_products(1)
+    response = client.get("/api/v1/product/1", headers=api_headers)
+    for validator in (
+        {"If-None-Match": response.headers["ETag"]},
+        {"If-Modified-Since": response.headers["Last-Modified"]},
+    ):
+        revalidated = client.get(
+            "/api/v1/product/1", headers={**api_headers, **validator}
+        )
+        assert revalidated.status_code == 304
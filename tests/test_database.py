@@ -0,0 +1,29 @@
+import gc
+import os
+
+from sqlalchemy import create_engine
+
+from app import database, db
+
+
+def test_fork_handler_holds_engines_weakly():
+    engine = create_engine("sqlite://")
+    database._engines.add(engine)
+    del engine
+    gc.collect()
+    assert not any(e.url.database is None for e in database._engines)
+
+
+def test_forked_child_gets_fresh_pools(app):
+    with app.app_context():
+        db.session.execute("SELECT 1")
+        db.session.remove()
+        pool = db.engine.pool
+        assert pool.checkedin() == 1
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write, str(db.engine.pool.checkedin()).encode())
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert os.read(read, 16) == b"0"
@@ -0,0 +1,26 @@
+import io
+import logging
+
+from app import db
+from app.models import Category, Product
+
+
+def test_corrupt_upload_still_creates_the_product(make_app, tmp_path, caplog):
+    app = make_app(UPLOAD_FOLDER=str(tmp_path / "uploads"))
+    with app.app_context():
+        db.session.add(Category("Kitchen"))
+        db.session.commit()
+    data = {
+        "name": "Kettle",
+        "price": "12.50",
+        "category": "1",
+        "image": (io.BytesIO(b"not an image"), "kettle.png"),
+    }
+    with caplog.at_level(logging.ERROR, logger="app.images"):
+        response = app.test_client().post("/create-product", data=data)
+    assert response.status_code == 302
+    assert "Generating variants" in caplog.text
+    with app.app_context():
+        product = Product.query.one()
+        assert product.image_path.endswith(".png")
+        assert not product.image_variants
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+
+from app import db
+from app.importer import Importer, sqlite_bulk_load
+from app.models import Product
+
+
+def pragmas(connection):
+    return {
+        name: connection.execute(text(f"PRAGMA {name}")).scalar()
+        for name in ("journal_mode", "synchronous", "cache_size", "temp_store")
+    }
+
+
+def test_bulk_load_restores_connection_settings(app):
+    with app.app_context(), db.engine.connect() as connection:
+        before = pragmas(connection)
+        with sqlite_bulk_load(connection):
+            assert pragmas(connection) != before
+        assert pragmas(connection) == before
+
+
+def test_import_creates_products_and_categories(app):
+    rows = [
+        {"name": "Kettle", "price": 20, "category": "Kitchen"},
+        {"name": "Pan", "price": 30, "category": " kitchen"},
+        {"name": "", "price": 1, "category": "Kitchen"},
+    ]
+    with app.app_context():
+        run = Importer(batch_size=2).run(rows)
+        assert (run.imported, run.skipped) == (2, 1)
+        names = {p.name: p.category.name for p in Product.query}
+    assert names == {"Kettle": "Kitchen", "Pan": "Kitchen"}
+
+
+def test_import_command_warns_about_a_local_cache(app, tmp_path):
+    source = tmp_path / "products.ndjson"
+    source.write_text('{"name": "Kettle", "price": 20, "category": "Kitchen"}\n')
+    result = app.test_cli_runner().invoke(args=["catalog", "import", str(source)])
+    assert result.exit_code == 0, result.output
+    assert "Imported 1 products" in result.output
+    assert "CACHE_TYPE=redis" in result.output
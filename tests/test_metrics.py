@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.fixture
+def metrics_app(make_app):
+    return make_app(METRICS_TOKEN="scrape")
+
+
+def test_metrics_need_the_token(metrics_app):
+    client = metrics_app.test_client()
+    assert client.get("/metrics").status_code == 404
+    wrong = {"Authorization": "Bearer guess"}
+    assert client.get("/metrics", headers=wrong).status_code == 404
+    right = {"Authorization": "Bearer scrape"}
+    response = client.get("/metrics", headers=right)
+    assert response.status_code == 200
+    assert b"request_duration_seconds" in response.data
+
+
+def test_metrics_without_a_token_are_local_only(app, client):
+    assert client.get("/metrics").status_code == 200
+    remote = {"REMOTE_ADDR": "203.0.113.9"}
+    assert client.get("/metrics", environ_base=remote).status_code == 404
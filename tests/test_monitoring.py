@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+import sentry_sdk
+from sentry_sdk.transport import Transport
+from werkzeug.test import EnvironBuilder
+
+from app import monitoring
+
+
+class RecordingTransport(Transport):
+    """Keeps the envelopes Sentry would send instead of sending them."""
+
+    envelopes = []
+
+    def capture_envelope(self, envelope):
+        self.envelopes.append(envelope)
+
+    def capture_event(self, event):
+        pass
+
+
+@pytest.fixture
+def traced_app(make_app):
+    RecordingTransport.envelopes = []
+    app = make_app(
+        SENTRY_DSN="https://key@sentry.invalid/1",
+        SENTRY_TRANSPORT=RecordingTransport,
+        SENTRY_TRACES_SAMPLE_RATE=0.0,
+        SENTRY_ENDPOINT_SAMPLE_RATES={"main.products": 1.0},
+    )
+    yield app
+    sentry_sdk.Hub.current.bind_client(None)
+
+
+def transaction_events():
+    return [
+        envelope.get_transaction_event()
+        for envelope in RecordingTransport.envelopes
+        if envelope.get_transaction_event()
+    ]
+
+
+def transactions():
+    return [event["transaction"] for event in transaction_events()]
+
+
+def sampling_context(path):
+    return {"wsgi_environ": EnvironBuilder(path=path).get_environ()}
+
+
+def test_traces_sampler_uses_the_endpoint_rate(traced_app):
+    sampler = monitoring._sampler
+    assert sampler.traces_sampler(sampling_context("/products")) == 1.0
+    assert sampler.traces_sampler(sampling_context("/categories")) == 0.0
+    assert sampler.traces_sampler(sampling_context("/missing")) == 0.0
+    assert sampler.traces_sampler({"parent_sampled": True}) is True
+
+
+def test_only_sampled_endpoints_send_transactions(traced_app):
+    client = traced_app.test_client()
+    assert client.get("/categories").status_code == 200
+    assert client.get("/products").status_code == 200
+    sentry_sdk.flush()
+    assert transactions() == ["main.products"]
+
+
+def test_transactions_have_query_and_template_spans(traced_app):
+    client = traced_app.test_client()
+    assert client.get("/products").status_code == 200
+    sentry_sdk.flush()
+    [event] = transaction_events()
+    spans = {(span["op"], span.get("description")) for span in event["spans"]}
+    assert any(op == "db" and sql.startswith("SELECT product.") for op, sql in spans)
+    assert ("template.render", "fragments/products.html") in spans
+    assert ("template.render", "page.html") in spans
+
+
+def test_slow_request_mode_keeps_slow_transactions(make_app):
+    make_app(
+        SENTRY_DSN="https://key@sentry.invalid/1",
+        SENTRY_TRANSPORT=RecordingTransport,
+        SENTRY_TRACES_SAMPLE_RATE=0.0,
+        SENTRY_ENDPOINT_SAMPLE_RATES={"main.products": 0.5},
+        SENTRY_SLOW_REQUEST_MS=100,
+    )
+    try:
+        sampler = monitoring._sampler
+        # Every request with a non-zero rate is traced, to be sampled later
+        assert sampler.traces_sampler(sampling_context("/products")) == 1.0
+        assert sampler.traces_sampler(sampling_context("/categories")) == 0.0
+
+        started = datetime(2021, 1, 1)
+
+        def transaction(milliseconds):
+            return {
+                "type": "transaction",
+                "transaction": "main.categories",
+                "start_timestamp": started,
+                "timestamp": started + timedelta(milliseconds=milliseconds),
+            }
+
+        assert sampler.keep_transaction(transaction(250), {}) is not None
+        assert sampler.keep_transaction(transaction(20), {}) is None
+    finally:
+        sentry_sdk.Hub.current.bind_client(None)
@@ -0,0 +1,15 @@
+from types import SimpleNamespace
+
+from app import db
+from app.plans import check_plans
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context(), db.engine.connect() as connection:
+        results = check_plans(connection)
+    assert results and not any(results.values()), results
+
+
+def test_databases_without_a_plan_check_are_skipped():
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="mysql"))
+    assert check_plans(connection) is None
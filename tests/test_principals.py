@@ -0,0 +1,28 @@
+from app import db, principals
+from app.auth.models import User
+from app.auth.principals import UserPrincipal
+from app.auth.views import load_user
+
+
+def test_loaded_users_are_cached_until_changed(app, count_statements):
+    with app.app_context():
+        assert load_user("1").username == "tester"
+        with count_statements(app) as statements:
+            assert load_user("1").admin is False
+        assert statements == []
+
+        User.query.get(1).admin = True
+        db.session.commit()
+        assert load_user("1").admin is True
+
+
+def test_snapshot_loaded_before_a_change_is_not_cached(app):
+    with app.app_context():
+        generation = principals.generation(1)
+        stale = UserPrincipal.from_user(User.query.get(1))
+        # Another request changes the user before this one caches it
+        User.query.get(1).admin = True
+        db.session.commit()
+        principals.add(stale, generation)
+        assert principals.get(1, principals.generation(1)) is None
+        assert load_user("1").admin is True
@@ -0,0 +1,66 @@
+def test_product_list_page_does_not_query_per_product(
+    client, add_products, count_statements
+):
+    add_products(12)
+    with count_statements() as statements:
+        response = client.get("/products")
+    assert response.status_code == 200
+    assert b"Category 11" in response.data
+    # The page of products with their categories in one query
+    assert len(statements) == 1
+
+
+def test_product_page_loads_its_category_with_the_product(
+    client, add_products, count_statements
+):
+    add_products(1)
+    with count_statements() as statements:
+        response = client.get("/product/1")
+    assert response.status_code == 200
+    # The validators, then the product with its category
+    assert len(statements) == 2
+
+
+def test_api_list_statement_count_does_not_grow_with_the_page(
+    client, api_headers, add_products, count_statements
+):
+    add_products(20)
+    # Verify the credentials once, so both pages are served from the cache
+    client.get("/api/v1/product?limit=1", headers=api_headers)
+    counts = []
+    for limit in (2, 20):
+        with count_statements() as statements:
+            response = client.get(f"/api/v1/product?limit={limit}", headers=api_headers)
+        assert response.status_code == 200
+        assert len(response.json) == limit
+        counts.append(len(statements))
+    assert counts == [2, 2]
+
+
+def test_api_detail_statement_count(
+    client, api_headers, add_products, count_statements
+):
+    add_products(1)
+    client.get("/api/v1/product/1", headers=api_headers)
+    with count_statements() as statements:
+        response = client.get("/api/v1/product/1", headers=api_headers)
+    assert response.status_code == 200
+    assert response.json["1"]["category"] == "Category 0"
+    assert len(statements) == 2
+
+
+def test_api_list_limit_is_bounded(app, client, api_headers, add_products):
+    add_products(5)
+    for limit in (0, -5):
+        response = client.get(f"/api/v1/product?limit={limit}", headers=api_headers)
+        assert response.status_code == 400
+        response = client.get(
+            f"/api/v1/product?limit={limit}&page=1", headers=api_headers
+        )
+        assert response.status_code == 400
+
+    app.config["API_MAX_LIMIT"] = 3
+    response = client.get("/api/v1/product?limit=1000000", headers=api_headers)
+    assert response.status_code == 200
+    assert len(response.json) == 3
+    assert "X-Next-Cursor" in response.headers
@@ -0,0 +1,92 @@
+import pytest
+
+from app import db
+
+
+@pytest.fixture
+def limited_app(make_app, app):
+    # Shares the app fixture's database and user
+    limited = make_app(
+        RATELIMIT_ENABLED=True,
+        RATELIMIT_AUTH_FAILURE_RATE=0.01,
+        RATELIMIT_AUTH_FAILURE_BURST=3,
+        RATELIMIT_MAX_WRITES=1,
+    )
+    yield limited
+    with limited.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def bad_credentials(headers):
+    return {"Authorization": headers["Authorization"][:-4] + "AAAA"}
+
+
+def test_failed_authentications_are_shed_before_verification(
+    limited_app, api_headers, count_statements
+):
+    limited_client = limited_app.test_client()
+    wrong = bad_credentials(api_headers)
+    statuses = [
+        limited_client.get("/api/v1/product", headers=wrong).status_code
+        for _ in range(3)
+    ]
+    assert statuses == [401, 401, 401]
+    with count_statements(limited_app) as statements:
+        response = limited_client.get("/api/v1/product", headers=wrong)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert statements == []
+    response = limited_client.post("/api/v1/token", headers=wrong)
+    assert response.status_code == 429
+
+
+def test_limits_only_apply_to_their_app(limited_app, client, api_headers):
+    wrong = bad_credentials(api_headers)
+    statuses = {
+        client.get("/api/v1/product", headers=wrong).status_code for _ in range(5)
+    }
+    assert statuses == {401}
+
+
+def test_clients_behind_a_proxy_have_their_own_budgets(make_app, app, api_headers):
+    proxied = make_app(
+        RATELIMIT_ENABLED=True,
+        RATELIMIT_AUTH_FAILURE_RATE=0.01,
+        RATELIMIT_AUTH_FAILURE_BURST=3,
+        PROXY_FIX_X_FOR=1,
+    )
+    client = proxied.test_client()
+    wrong = bad_credentials(api_headers)
+    router = {"REMOTE_ADDR": "10.0.0.1"}
+
+    def get(address):
+        headers = {**wrong, "X-Forwarded-For": address}
+        return client.get("/api/v1/product", headers=headers, environ_base=router)
+
+    statuses = [get("203.0.113.1").status_code for _ in range(4)]
+    assert statuses == [401, 401, 401, 429]
+    assert get("203.0.113.2").status_code == 401
+
+
+def test_successful_authentications_are_not_counted(limited_app, api_headers):
+    limited_client = limited_app.test_client()
+    for _ in range(5):
+        response = limited_client.get("/api/v1/product", headers=api_headers)
+        assert response.status_code == 200
+
+
+def test_writes_wait_for_a_free_slot(limited_app, api_headers):
+    limiter = limited_app.extensions["rate_limiter"]
+    client = limited_app.test_client()
+    body = {"name": "Kettle", "price": 5, "category": {"name": "Kitchen"}}
+
+    token = limiter.backend.acquire("writes", 1, 60)
+    response = client.post("/api/v1/product", json=body, headers=api_headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    limiter.backend.release("writes", token)
+    for _ in range(2):
+        response = client.post("/api/v1/product", json=body, headers=api_headers)
+        assert response.status_code == 200
@@ -0,0 +1,33 @@
+from app import category_registry, db
+
+
+def test_each_app_keeps_its_own_categories(app, make_app, tmp_path, add_products):
+    add_products(1)
+    with app.app_context():
+        assert category_registry.names() == {1: "Category 0"}
+    other = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'other.db'}")
+    with other.app_context():
+        assert category_registry.names() == {}
+
+
+def test_category_missing_from_the_map_is_looked_up(app, client, add_products):
+    add_products(1)
+    with app.test_request_context():
+        assert category_registry.names() == {1: "Category 0"}
+    # As if another worker had created it since the map was loaded
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(
+                db.text(
+                    "INSERT INTO category (id, name, name_key) VALUES (2, 'New', 'new')"
+                )
+            )
+    response = client.post(
+        "/create-product", data={"name": "Kettle", "price": "1", "category": "2"}
+    )
+    assert response.status_code == 302
+    response = client.post(
+        "/create-product", data={"name": "Kettle", "price": "1", "category": "3"}
+    )
+    assert response.status_code == 200
+    assert b"Not a valid choice" in response.data
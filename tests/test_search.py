@@ -0,0 +1,46 @@
+import re
+from html import unescape
+from urllib.parse import parse_qsl, urlsplit
+
+from app import db
+from app.models import Category, Product
+from app.search import is_index_table
+
+
+def test_index_tables_are_told_apart_from_model_tables():
+    for name in ("product_fts", "product_fts_data", "category_fts_idx"):
+        assert is_index_table(name)
+    for name in ("product", "category", "user", "alembic_version"):
+        assert not is_index_table(name)
+
+
+def page_links(response):
+    """The query string of each pagination link, as a dict."""
+    html = response.get_data(as_text=True)
+    hrefs = re.findall(r'class="p-pagination__link--(\w+)"\s+href="([^"]+)"', html)
+    return [(rel, dict(parse_qsl(urlsplit(unescape(h)).query))) for rel, h in hrefs]
+
+
+def test_products_and_categories_page_separately(app, client):
+    with app.app_context():
+        categories = [Category(f"Lamp c{i}") for i in range(13)]
+        db.session.add_all(categories)
+        for i in range(30):
+            db.session.add(Product(f"Lamp p{i}", 1.0, categories[0], None))
+        db.session.commit()
+
+    response = client.get("/search?query=lamp")
+    assert response.status_code == 200
+    assert page_links(response) == [
+        ("next", {"query": "lamp", "page": "2", "category_page": "1"}),
+        ("next", {"query": "lamp", "page": "1", "category_page": "2"}),
+    ]
+
+    response = client.get("/search?query=lamp&page=3&category_page=2")
+    assert response.status_code == 200
+    assert "Lamp p29" in response.get_data(as_text=True)
+    assert "Lamp c12" in response.get_data(as_text=True)
+    assert page_links(response) == [
+        ("previous", {"query": "lamp", "page": "2", "category_page": "2"}),
+        ("previous", {"query": "lamp", "page": "3", "category_page": "1"}),
+    ]